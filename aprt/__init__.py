@@ -26,28 +26,70 @@
 
 from . import (
 	alpm,
+	cache,
+	graph,
+	mapped,
 	package,
+	satisfy,
+	snapshot,
 	srcinfo,
+	stats,
+	universe,
 	util,
 	version
 )
 
 parse_alpm_dict          = alpm.parse_alpm_dict
 parse_info_dict          = alpm.parse_info_dict
+parse_alpm_bytes         = alpm.parse_alpm_bytes
+parse_info_bytes         = alpm.parse_info_bytes
 alpm_dict_to_package     = alpm.alpm_dict_to_package
 read_package_archive     = alpm.read_package_archive
 read_package_file        = alpm.read_package_file
+iter_package_db_archive  = alpm.iter_package_db_archive
+iter_package_db          = alpm.iter_package_db
 read_package_db_archive  = alpm.read_package_db_archive
 read_package_db_file     = alpm.read_package_db_file
+PackageCache             = alpm.PackageCache
+
+FileCache = cache.FileCache
+
+MappedRepository       = mapped.MappedRepository
+save_mapped_repository = mapped.save_mapped_repository
+load_mapped_repository = mapped.load_mapped_repository
 
 Constraint = package.Constraint
 Dependency = package.Dependency
 
 Package                 = package.Package
+ProvidesIndex           = package.ProvidesIndex
 package_from_name       = package.package_from_name
+dependency_graph        = package.dependency_graph
 neighbour_table         = package.neighbour_table
 reverse_neighbour_table = package.reverse_neighbour_table
 reachability_table      = package.reachability_table
+reverse_dependencies    = package.reverse_dependencies
+search_reverse_dependencies = package.search_reverse_dependencies
+
+DependencyGraph      = graph.DependencyGraph
+build_order          = graph.build_order
+build_waves          = graph.build_waves
+DependencyCycleError = graph.DependencyCycleError
+
+BrokenDependency   = satisfy.BrokenDependency
+UpgradeResult      = satisfy.UpgradeResult
+check_dependencies = satisfy.check_dependencies
+simulate_upgrade   = satisfy.simulate_upgrade
+
+RepositoryDiff    = snapshot.RepositoryDiff
+diff_repositories = snapshot.diff_repositories
+save_snapshot     = snapshot.save_snapshot
+load_snapshot     = snapshot.load_snapshot
+
+Layer    = universe.Layer
+Universe = universe.Universe
 
-SrcInfo    = srcinfo.SrcInfo
-Version    = version.Version
+SrcInfo          = srcinfo.SrcInfo
+SrcInfoCache     = srcinfo.SrcInfoCache
+Version          = version.Version
+compare_versions = version.compare_versions
@@ -0,0 +1,216 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Coroutine versions of the loaders of aprt, for use from an asyncio event loop.
+
+The blocking work runs in a bounded thread pool, shared by all functions in this module unless an executor is given.
+libarchive is called through ctypes, which releases the GIL, so decompressing several databases overlaps.
+
+Cancelling a coroutine or async iterator (directly or through a timeout) also stops the worker thread
+at the next package it reads, so cancelled loads do not keep the pool busy.
+Reading a single package archive can not be interrupted, but it is short.
+"""
+
+import asyncio
+import concurrent.futures
+import contextlib
+import threading
+
+from . import alpm
+from . import stats
+from .srcinfo import SrcInfo, SrcInfoCache
+from .universe import Universe
+
+# The number of worker threads of the shared executor, or None for the default of ThreadPoolExecutor.
+MAX_WORKERS = None
+
+# The number of packages sent to the event loop at once by iter_package_db().
+CHUNK_SIZE = 64
+
+_executor      = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+	"""
+	Get the shared executor, creating it on first use.
+	"""
+	global _executor
+	with _executor_lock:
+		if _executor is None:
+			_executor = concurrent.futures.ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix='aprt-aio')
+		return _executor
+
+def set_executor(executor):
+	"""
+	Replace the shared executor.
+	The old executor is not shut down.
+	"""
+	global _executor
+	with _executor_lock:
+		_executor = executor
+
+class _Stopped(Exception):
+	pass
+
+def _until(stop, iterable):
+	"""
+	Pass through the items of an iterable, raising _Stopped once the stop event is set.
+	"""
+	with contextlib.closing(iter(iterable)) as iterator:
+		for item in iterator:
+			if stop.is_set(): raise _Stopped()
+			yield item
+
+async def _run(function, stop = None, executor = None, timeout = None):
+	"""
+	Run a blocking function in the executor and wait for the result.
+	If the wait is cancelled or times out, the stop event (if any) is set.
+	"""
+	loop   = asyncio.get_running_loop()
+	future = loop.run_in_executor(executor or get_executor(), function)
+	try:
+		return await asyncio.wait_for(future, timeout)
+	except BaseException:
+		if stop is not None: stop.set()
+		raise
+
+async def read_package_file(filename, executor = None, timeout = None):
+	"""
+	Read the metadata of a package archive.
+	See alpm.read_package_file().
+	"""
+	return await _run(lambda: alpm.read_package_file(filename), None, executor, timeout)
+
+async def read_package_files(filenames, executor = None, timeout = None):
+	"""
+	Read the metadata of several package archives concurrently.
+	Returns a list of packages in the order of the filenames.
+	The timeout applies to reading all archives together.
+	"""
+	return await asyncio.wait_for(asyncio.gather(*(read_package_file(filename, executor) for filename in filenames)), timeout)
+
+async def read_package_db_file(filename, fields = None, executor = None, timeout = None):
+	"""
+	Read a repository database file.
+	See alpm.read_package_db_file().
+	"""
+	stop = threading.Event()
+	def read():
+		with stats.span('alpm.read_package_db_file'):
+			return alpm.merge_packages(_until(stop, alpm.iter_package_db(filename, fields)))
+	return await _run(read, stop, executor, timeout)
+
+async def load_databases(filenames, fields = None, executor = None, timeout = None):
+	"""
+	Read several repository database files concurrently.
+	Returns a dictionary of the packages of each database indexed by filename, in the order of the filenames.
+	The timeout applies to reading all databases together.
+	"""
+	filenames    = list(filenames)
+	repositories = await asyncio.wait_for(asyncio.gather(*(read_package_db_file(filename, fields, executor) for filename in filenames)), timeout)
+	return dict(zip(filenames, repositories))
+
+async def load_universe(filenames, executor = None, timeout = None):
+	"""
+	Read several repository database files concurrently into a Universe.
+	See Universe.load().
+	"""
+	with stats.span('universe.load'):
+		return Universe((await load_databases(filenames, None, executor, timeout)).items())
+
+async def iter_package_db(filename, fields = None, executor = None, buffer = 4):
+	"""
+	Read packages from a repository database file one at a time as an async iterator.
+	See alpm.iter_package_db().
+
+	At most buffer chunks of CHUNK_SIZE packages are read ahead of the consumer.
+	Leaving the loop early stops the worker thread.
+	"""
+	loop  = asyncio.get_running_loop()
+	queue = asyncio.Queue()
+	slots = threading.Semaphore(buffer)
+	stop  = threading.Event()
+
+	def send(item):
+		try:
+			loop.call_soon_threadsafe(queue.put_nowait, item)
+		except RuntimeError:
+			# The event loop is closed, nobody is listening anymore.
+			stop.set()
+
+	def send_chunk(chunk):
+		while not slots.acquire(timeout=0.1):
+			if stop.is_set(): raise _Stopped()
+		send(chunk)
+
+	def produce():
+		try:
+			chunk = []
+			for package in _until(stop, alpm.iter_package_db(filename, fields)):
+				chunk.append(package)
+				if len(chunk) >= CHUNK_SIZE:
+					send_chunk(chunk)
+					chunk = []
+			if chunk: send_chunk(chunk)
+			send(None)
+		except _Stopped:
+			pass
+		except BaseException as error:
+			send(error)
+
+	loop.run_in_executor(executor or get_executor(), produce)
+	try:
+		while True:
+			item = await queue.get()
+			if item is None: return
+			if isinstance(item, BaseException): raise item
+			slots.release()
+			for package in item:
+				yield package
+	finally:
+		stop.set()
+
+async def read_srcinfo_file(filename, executor = None, timeout = None):
+	"""
+	Parse a .SRCINFO file.
+	See SrcInfo.parse_file().
+	"""
+	return await _run(lambda: SrcInfo.parse_file(filename), None, executor, timeout)
+
+async def load_srcinfo_db(root, jobs = 1, cache_file = None, ignore = (), executor = None, timeout = None):
+	"""
+	Load all .SRCINFO files in a directory tree.
+	See SrcInfo.load_db().
+
+	SQLite connections can not be shared between threads,
+	so the cache is given as filename of a SrcInfoCache and opened by the worker thread.
+	"""
+	def load():
+		if cache_file is None: return SrcInfo.load_db(root, jobs, None, ignore)
+		with SrcInfoCache(cache_file) as cache:
+			return SrcInfo.load_db(root, jobs, cache, ignore)
+	return await _run(load, None, executor, timeout)
@@ -24,28 +24,40 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
-import libarchive
+import json
+import logging
 import os
-from .package import Package, package_from_name
 
-def parse_alpm_dict(blob):
+# libarchive is imported by the functions that need it, because finding and loading the library is slow.
+from . import stats
+from .cache import FileCache, file_stat, unchanged
+from .package import Package, package_from_data, package_from_name
+
+# Package archives are read in blocks of this many compressed bytes.
+METADATA_BLOCK_SIZE = 64 * 1024
+
+# If .PKGINFO and .BUILDINFO are not found in this many compressed bytes, the archive is logged as slow to read.
+METADATA_PREFIX_LIMIT = 1024 * 1024
+
+def parse_alpm_dict(blob, fields = None):
 	"""
 	Parse a blob of text as ALPM file.
 	The results are returned as a dictionary with each key having a list of values.
+	If fields is given, only sections with a (lowercase) name in fields are kept.
 	"""
 	result = {}
-	key    = None
-	values = []
+	values = None
 	for line in blob.splitlines():
 		if len(line) == 0: continue
 
 		if line[0] == '%' and line[-1] == '%':
-			if key is not None: result[key] = values
-			key         = line[1:-1]
-			values      = []
-		else:
+			key    = line[1:-1]
+			values = None
+			if fields is None or key.lower() in fields:
+				values      = []
+				result[key] = values
+		elif values is not None:
 			values.append(line)
-	if key is not None: result[key] = values
 	return result
 
 def parse_info_dict(blob):
@@ -67,6 +79,56 @@ def parse_info_dict(blob):
 			result[key].append(value)
 	return result
 
+def parse_alpm_bytes(blob, fields = None):
+	"""
+	Parse a bytes-like blob as ALPM file.
+	Equivalent to parse_alpm_dict(), but only the kept keys and values are decoded.
+	"""
+	result = {}
+	values = None
+	for line in blob.splitlines():
+		if len(line) == 0: continue
+
+		if line[0] == 0x25 and line[-1] == 0x25: # b'%'
+			key    = line[1:-1].decode()
+			values = None
+			if fields is None or key.lower() in fields:
+				values      = []
+				result[key] = values
+		elif values is not None:
+			values.append(line.decode())
+	return result
+
+def parse_info_bytes(blob):
+	"""
+	Parse a bytes-like blob as .PKGINFO or .BUILDINFO file.
+	Equivalent to parse_info_dict(), but works on the undecoded data.
+	"""
+	result = {}
+	for line in blob.splitlines():
+		if len(line) == 0 or line[0] == 0x23: continue # b'#'
+
+		key, value = line.split(b'=', 1)
+		key        = key.strip().decode()
+		value      = value.strip().decode()
+
+		if not key in result:
+			result[key] = [value]
+		else:
+			result[key].append(value)
+	return result
+
+def read_entry(entry, buffer):
+	"""
+	Read the data of an archive entry into a reusable bytearray.
+	Returns the buffer.
+	"""
+	buffer.clear()
+	for block in entry.get_blocks():
+		buffer += block
+	if stats.enabled: stats.count('alpm.bytes_decompressed', len(buffer))
+	return buffer
+
 def alpm_dict_to_package(data):
 	name    = data['NAME'][0]
 	package = Package(name)
@@ -78,6 +140,7 @@ def read_package_archive(archive):
 	data      = {}
 	pkginfo   = False
 	buildinfo = False
+	buffer    = bytearray()
 	for entry in archive:
 		if entry.isdir: continue
 		if entry.pathname == '.PKGINFO':
@@ -86,7 +149,7 @@ def read_package_archive(archive):
 			buildinfo = True
 		else:
 			continue
-		data.update(parse_info_dict("".join(map(lambda x: x.decode(), entry.get_blocks()))))
+		data.update(parse_info_bytes(read_entry(entry, buffer)))
 		if pkginfo and buildinfo:
 			break
 	if not pkginfo:   raise RuntimeError("Found no .PKGINFO in archive.")
@@ -98,27 +161,201 @@ def read_package_archive(archive):
 
 	return package
 
+class _CountingStream:
+	"""
+	A file wrapper for libarchive.stream_reader() that counts the bytes read.
+	Seeking is not offered, so libarchive reads the archive front to back and the count is the real amount of I/O.
+	"""
+	def __init__(self, file):
+		self.file     = file
+		self.consumed = 0
+
+	def readinto(self, buffer):
+		length = self.file.readinto(buffer)
+		self.consumed += length
+		return length
+
+	def seekable(self):
+		return False
+
+def _check_prefix(archive, stream, filename, limit):
+	"""
+	Pass through the entries of an archive, logging the archive once if reading goes past the prefix limit.
+	"""
+	for entry in archive:
+		if stream.consumed > limit:
+			logging.warning("Package metadata is not at the start of `{}', read {} bytes so far.".format(filename, stream.consumed))
+			stats.count('alpm.prefix_fallbacks')
+			yield entry
+			yield from archive
+			return
+		yield entry
+
+def read_package_metadata(filename, limit = METADATA_PREFIX_LIMIT, block_size = METADATA_BLOCK_SIZE):
+	"""
+	Read the metadata of a package archive, reading only the start of the compressed stream when possible.
+
+	The archive is read in blocks of block_size bytes and decompression stops as soon as .PKGINFO and .BUILDINFO are found.
+	For archives made by makepkg that is within the first block.
+	If the files are not found in the first limit bytes, the archive is logged and read further until they are found.
+	Returns a tuple (package, consumed) with the package and the number of compressed bytes read.
+	"""
+	stats.count('alpm.archives_opened')
+	import libarchive
+	with stats.span('alpm.read_package_file'), open(filename, 'rb', buffering=0) as file:
+		stream = _CountingStream(file)
+		with libarchive.stream_reader(stream, block_size=block_size) as archive:
+			package = read_package_archive(_check_prefix(archive, stream, filename, limit))
+	if stats.enabled: stats.count('alpm.archive_bytes_read', stream.consumed)
+	logging.debug("Read {} bytes of `{}' for its metadata.".format(stream.consumed, filename))
+	return package, stream.consumed
+
 def read_package_file(filename):
-	with libarchive.file_reader(filename) as archive:
-		return read_package_archive(archive)
+	return read_package_metadata(filename)[0]
 
-def read_package_db_archive(archive):
-	result = {}
+# The .PKGINFO keys that have a different name in repository databases.
+PKGINFO_DB_FIELDS = {
+	'pkgbase':     'base',
+	'pkgdesc':     'desc',
+	'group':       'groups',
+	'size':        'isize',
+	'conflict':    'conflicts',
+	'depend':      'depends',
+	'optdepend':   'optdepends',
+	'makedepend':  'makedepends',
+	'checkdepend': 'checkdepends',
+}
+
+def archive_package_to_db(package):
+	"""
+	Convert a package read from a package archive to the field names of a repository database.
+	The .PKGINFO keys are singular (depend, conflict, ...) and pkgver holds the full version,
+	so the dependency and version accessors only work on the converted package.
+	"""
+	version = package.get_value('pkgver')
+	result  = package_from_name('{}-{}'.format(package.name, version))
+	result.add_value('version', version)
+	for key, values in package.data.items():
+		if key in ('pkgname', 'pkgver'): continue
+		result.add_values(PKGINFO_DB_FIELDS.get(key, key), values)
+	return result
+
+def read_package_file_as_db(filename):
+	"""
+	Read the metadata of a package archive with the field names of a repository database.
+	See archive_package_to_db().
+	"""
+	return archive_package_to_db(read_package_file(filename))
+
+class PackageCache(FileCache):
+	"""
+	A persistent cache of package metadata read from package archives.
+	The cache is stored in an SQLite database.
+	Entries are keyed by the path of the archive and are invalidated when the size,
+	the modification time or (if given) the expected sha256sum of the archive changes.
+	"""
+	table   = 'packages'
+	columns = ('sha256sum', 'data')
+
+	@staticmethod
+	def default_path(db_filename):
+		"""
+		Get the default location of the cache for the archives of a repository database.
+		"""
+		return db_filename + '.cache.sqlite'
+
+	def get(self, filename, sha256sum = None):
+		"""
+		Get the cached package for an archive, or None if there is no valid cache entry.
+		"""
+		row = self.get_row(filename)
+		if row is None: return None
+
+		cached_sha256sum, data = row
+		if sha256sum is not None and cached_sha256sum is not None and sha256sum != cached_sha256sum: return None
+		return package_from_data(json.loads(data))
+
+	def put(self, filename, package, sha256sum = None, stat = None):
+		"""
+		Add or replace the cache entry for an archive.
+		If stat is given, the entry is stored for the archive as it was when that stat was taken, see FileCache.put_row().
+		"""
+		self.put_row(filename, (sha256sum, json.dumps(package.data)), stat)
+
+	def read_package_file(self, filename, sha256sum = None):
+		"""
+		Read a package archive, using the cached metadata if it is still valid.
+		"""
+		package = self.get(filename, sha256sum)
+		stats.count('alpm.cache_hits' if package is not None else 'alpm.cache_misses')
+		if package is None:
+			stat    = file_stat(filename)
+			package = read_package_file(filename)
+			if unchanged(filename, stat): self.put(filename, package, sha256sum, stat)
+		return package
+
+def iter_package_db_archive(archive, fields = None):
+	"""
+	Read packages from a repository database archive one at a time.
+	If fields is given, only the sections with a (lowercase) name in fields are parsed.
+	The name and version of the packages are always available.
+	"""
+	package      = None
+	package_path = None
+	buffer       = bytearray()
 	for entry in archive:
 		if entry.isdir: continue
 
-		package = package_from_name(os.path.dirname(entry.pathname))
-		if package.name not in result:
-			result[package.name] = package
-		else:
-			package = result[package.name]
+		path = os.path.dirname(entry.pathname)
+		if path != package_path:
+			if package is not None: yield package
+			package      = package_from_name(path)
+			package_path = path
+
+		# The files entry holds nothing but the %FILES% section, so don't bother decoding it.
+		if fields is not None and 'files' not in fields and os.path.basename(entry.pathname) == 'files':
+			continue
 
-		data = parse_alpm_dict("".join(map(lambda x: x.decode(), entry.get_blocks())))
+		data = parse_alpm_bytes(read_entry(entry, buffer), fields)
 		for key, values in data.items():
 			package.add_values(key.lower(), values)
 
-	return result
+	if package is not None: yield package
 
-def read_package_db_file(filename):
+def iter_package_db(filename, fields = None):
+	"""
+	Read packages from a repository database file one at a time.
+	See iter_package_db_archive().
+	"""
+	stats.count('alpm.databases_opened')
+	import libarchive
 	with libarchive.file_reader(filename) as archive:
-		return read_package_db_archive(archive)
+		yield from iter_package_db_archive(archive, fields)
+
+def merge_packages(packages):
+	"""
+	Collect packages as returned by iter_package_db_archive() in a dictionary indexed by name.
+	"""
+	result = {}
+	for package in packages:
+		if package.name not in result:
+			result[package.name] = package
+			continue
+
+		# Entries for the same package were not stored consecutively,
+		# merge the parsed data but not the fields derived from the entry name.
+		existing = result[package.name]
+		for key, values in package.data.items():
+			if key in ('pkgname', 'pkgver', 'pkgrel', 'epoch'): continue
+			existing.add_values(key, values)
+
+	return result
+
+def read_package_db_archive(archive, fields = None):
+	return merge_packages(iter_package_db_archive(archive, fields))
+
+def read_package_db_file(filename, fields = None):
+	stats.count('alpm.databases_opened')
+	import libarchive
+	with stats.span('alpm.read_package_db_file'), libarchive.file_reader(filename) as archive:
+		return read_package_db_archive(archive, fields)
@@ -0,0 +1,120 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import sqlite3
+
+def file_stat(path):
+	"""
+	Stat a file, or return None if it does not exist.
+	"""
+	try:
+		return os.stat(path)
+	except FileNotFoundError:
+		return None
+
+def unchanged(path, stat):
+	"""
+	Check if a file still has the size and modification time of an earlier stat.
+	Values read from a file that changed while it was read must not be cached, so files are stat'ed before
+	they are read and the entry is only stored with that stat if this check passes after reading.
+	"""
+	current = file_stat(path)
+	if current is None or stat is None: return False
+	return current.st_size == stat.st_size and current.st_mtime_ns == stat.st_mtime_ns
+
+class FileCache:
+	"""
+	A persistent cache of values derived from files.
+	The cache is stored in an SQLite database.
+	Entries are keyed by the path of the file and are invalidated when the size or modification time changes.
+
+	Subclasses set the name of the table and the names of the value columns,
+	and convert their values to and from rows with get_row() and put_row().
+	"""
+	table   = None
+	columns = ()
+
+	def __init__(self, filename):
+		self.connection = sqlite3.connect(filename)
+		self.connection.execute(
+			'CREATE TABLE IF NOT EXISTS {} ('
+			'path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, {})'.format(self.table, ', '.join(x + ' TEXT' for x in self.columns))
+		)
+
+	def get_row(self, filename, stat = None):
+		"""
+		Get the cached values for a file as a tuple, or None if there is no valid cache entry.
+		If stat is given, it is used instead of calling os.stat() again.
+		"""
+		path = os.path.abspath(filename)
+		row  = self.connection.execute(
+			'SELECT size, mtime, {} FROM {} WHERE path = ?'.format(', '.join(self.columns), self.table),
+			(path,),
+		).fetchone()
+		if row is None: return None
+
+		if stat is None:
+			try:
+				stat = os.stat(path)
+			except FileNotFoundError:
+				return None
+		if stat.st_size != row[0] or stat.st_mtime_ns != row[1]: return None
+		return row[2:]
+
+	def put_row(self, filename, values, stat = None):
+		"""
+		Add or replace the cache entry for a file.
+		If stat is given, the entry is stored for that size and modification time instead of the current ones.
+		"""
+		path = os.path.abspath(filename)
+		if stat is None: stat = os.stat(path)
+		self.connection.execute(
+			'INSERT OR REPLACE INTO {} (path, size, mtime, {}) VALUES (?, ?, ?, {})'.format(
+				self.table, ', '.join(self.columns), ', '.join('?' for _ in self.columns)
+			),
+			(path, stat.st_size, stat.st_mtime_ns, *values),
+		)
+
+	def evict_missing(self):
+		"""
+		Remove all cache entries for files that no longer exist.
+		Returns the number of removed entries.
+		"""
+		paths = [path for path, in self.connection.execute('SELECT path FROM {}'.format(self.table))]
+		gone  = [(path,) for path in paths if not os.path.exists(path)]
+		self.connection.executemany('DELETE FROM {} WHERE path = ?'.format(self.table), gone)
+		return len(gone)
+
+	def close(self):
+		self.connection.commit()
+		self.connection.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
@@ -0,0 +1,165 @@
+# Copyright 2017-2020 Fizyr B.V.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+The command line tools of aprt.
+
+Every command lives in its own module with a DESCRIPTION, an add_arguments(parser) function
+and a run(options, session) function that returns an exit status or None.
+The modules are only imported when their command is used.
+"""
+
+import argparse
+import importlib
+import shlex
+import sys
+
+from .. import stats
+
+# The available commands with the module implementing them and a short description.
+COMMANDS = {
+	'bump-pkgrel':   ('bump_pkgrel',   'Bump the pkgrel of packages to one above their current value in a repository.'),
+	'check-deps':    ('check_deps',    'List dependencies that are not satisfied by any package in a set of repositories.'),
+	'clean-repo':    ('clean_repo',    'List or delete all binary packages that are no longer in a repository database.'),
+	'daemon':        ('daemon',        'Keep repositories and .SRCINFO files loaded and answer queries over a Unix socket.'),
+	'list-outdated': ('list_outdated', 'List packages with dependencies that have been built after themselves.'),
+	'list-unbuilt':  ('list_unbuilt',  'List unbuilt packages and/or their reverse dependencies.'),
+	'repo-add':      ('repo_add',      'Add package archives to or remove packages from a repository database.'),
+	'verify-repo':   ('verify_repo',   'Verify the package archives of a repository against its database.'),
+	'batch':         (None,            'Run several commands in one process, sharing the loaded data.'),
+}
+
+def load_command(name):
+	"""
+	Import the module implementing a command.
+	"""
+	module, _ = COMMANDS[name]
+	return importlib.import_module('.' + module, __name__)
+
+def make_parser(name, prog = None):
+	"""
+	Create the argument parser of a command.
+	"""
+	command = load_command(name)
+	parser  = argparse.ArgumentParser(prog=prog, description=command.DESCRIPTION)
+	command.add_arguments(parser)
+	return command, parser
+
+def command_main(name, argv = None, prog = None):
+	"""
+	Run a single command as a program.
+	"""
+	from .session import Session
+
+	command, parser = make_parser(name, prog)
+	stats.add_arguments(parser)
+	options = parser.parse_args(argv)
+	stats.setup(options)
+	status = command.run(options, Session())
+	stats.finish(options)
+	if status: sys.exit(status)
+
+def read_batch(file):
+	"""
+	Read the command lines of a batch file.
+	Empty lines and lines starting with a # are skipped.
+	"""
+	for line in file:
+		line = line.strip()
+		if not line or line.startswith('#'): continue
+		yield shlex.split(line)
+
+def batch_main(argv = None, prog = None):
+	"""
+	Run the commands from a batch file, one per line, with a shared session.
+	Repository databases are only read once and .SRCINFO files are only parsed again when they changed.
+	Execution stops at the first command that fails.
+	"""
+	from .session import Session
+
+	parser = argparse.ArgumentParser(prog=prog, description=COMMANDS['batch'][1])
+	parser.add_argument('file', nargs='?', default='-', help='The file with a command line on each line (default: standard input).')
+	stats.add_arguments(parser)
+	options = parser.parse_args(argv)
+	stats.setup(options)
+
+	if options.file == '-':
+		lines = list(read_batch(sys.stdin))
+	else:
+		with open(options.file, 'r') as file:
+			lines = list(read_batch(file))
+
+	# Parse all command lines first, so mistakes are reported before anything runs.
+	commands = []
+	for words in lines:
+		name = words[0]
+		if name.startswith('aprt-'): name = name[5:]
+		if name not in COMMANDS or COMMANDS[name][0] is None:
+			parser.error('unknown command in batch: {}'.format(words[0]))
+		command, command_parser = make_parser(name, 'aprt ' + name)
+		commands.append((name, command, command_parser.parse_args(words[1:])))
+
+	session = Session.shared()
+	status  = 0
+	try:
+		for name, command, command_options in commands:
+			with stats.span('batch.' + name):
+				status = command.run(command_options, session)
+			sys.stdout.flush()
+			if status: break
+	finally:
+		session.close()
+	stats.finish(options)
+	if status: sys.exit(status)
+
+def usage(file):
+	print('usage: aprt <command> [<args>]', file=file)
+	print('', file=file)
+	print('commands:', file=file)
+	for name, (_, description) in COMMANDS.items():
+		print('  {:<15} {}'.format(name, description), file=file)
+	print('', file=file)
+	print('Run aprt <command> --help for the arguments of a command.', file=file)
+
+def main(argv = None):
+	"""
+	The aprt program: dispatch to a command.
+	"""
+	if argv is None: argv = sys.argv[1:]
+	if not argv or argv[0] in ('-h', '--help'):
+		usage(sys.stdout if argv else sys.stderr)
+		sys.exit(0 if argv else 2)
+
+	name = argv[0]
+	if name not in COMMANDS:
+		print('aprt: unknown command: {}'.format(name), file=sys.stderr)
+		usage(sys.stderr)
+		sys.exit(2)
+
+	if name == 'batch':
+		batch_main(argv[1:], 'aprt batch')
+	else:
+		command_main(name, argv[1:], 'aprt ' + name)
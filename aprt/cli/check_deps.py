@@ -0,0 +1,69 @@
+# Copyright 2017-2020 Fizyr B.V.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from glob import glob
+
+import aprt
+from aprt.satisfy import check_dependencies, simulate_upgrade
+
+DESCRIPTION = 'List dependencies that are not satisfied by any package in a set of repositories.'
+
+def add_arguments(parser):
+	parser.add_argument('-r', '--repository',   dest='repository',   action='append',     default=[],    help='Add a database for package information.')
+	parser.add_argument('-s', '--sync',         dest='directory',    action='append',     default=[],    help='Add a directory of databases for package information.')
+	parser.add_argument('-m', '--makedepends',  dest='makedepends',  action='store_true',                help='Also check makedepends and checkdepends.')
+	parser.add_argument('-u', '--upgrade',      dest='upgrade',      action='append',     default=[],    help='Only report what breaks or gets fixed if this package archive is added to the repositories.')
+	parser.add_argument('--upgrade-db',         dest='upgrade_db',   action='append',     default=[],    help='Only report what breaks or gets fixed if the packages in this database are added to the repositories.')
+	parser.add_argument('-v', '--verbose',      dest='verbose',      action='store_true',                help='Show verbose output.')
+
+def run(options, session):
+	repositories = list(options.repository)
+	for directory in options.directory:
+		repositories += glob(directory + '/*.db')
+	universe = session.universe(repositories)
+	fields   = ('depends', 'makedepends', 'checkdepends') if options.makedepends else ('depends',)
+
+	if not options.upgrade and not options.upgrade_db:
+		broken = check_dependencies(universe, fields=fields)
+		for dependency in broken:
+			print(dependency)
+		if options.verbose:
+			print('broken: {}'.format(len(broken)))
+		return 1 if broken else 0
+
+	upgrades = {}
+	for filename in options.upgrade_db:
+		upgrades.update(session.database(filename))
+	for filename in options.upgrade:
+		package = aprt.alpm.read_package_file_as_db(filename)
+		upgrades[package.name] = package
+
+	result = simulate_upgrade(universe, upgrades, fields)
+	for dependency in result.broken:
+		print('broken: {}'.format(dependency))
+	for dependency in result.fixed:
+		print('fixed: {}'.format(dependency))
+	return 1 if result.broken else 0
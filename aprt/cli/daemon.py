@@ -0,0 +1,58 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from glob import glob
+import os
+
+import aprt
+import aprt.daemon
+
+DESCRIPTION = 'Keep repositories and .SRCINFO files loaded and answer queries from the aprt tools over a Unix socket.'
+
+def add_arguments(parser):
+	parser.add_argument('-S', '--socket',       dest='socket',       required=True,                     help='The path of the Unix socket to listen on.')
+	parser.add_argument('-p', '--pkgbuild-dir', dest='pkgbuild_dir', default=None,                      help='The base path of the PKGBUILD and .SRCINFO directories.')
+	parser.add_argument('-r', '--repository',   dest='repository',   action='append', default=[],       help='A repository for unbuilt and reverse dependency queries.')
+	parser.add_argument('-c', '--check',        dest='check',        default=None,                      help='The repository to check for outdated queries.')
+	parser.add_argument('-d', '--database',     dest='database',     action='append', default=[],       help='Add a database for package information for outdated queries.')
+	parser.add_argument('-s', '--sync',         dest='directory',    action='append', default=[],       help='Add a directory of databases for package information for outdated queries.')
+	parser.add_argument('-j', '--jobs',         dest='jobs',         type=int,        default=1,        help='Read package archives with this many worker processes (0 to use all CPUs).')
+	parser.add_argument('--ignore-dir',         dest='ignore_dir',   action='append', default=[],       help='Do not search directories with this name for .SRCINFO files.')
+
+def run(options, session):
+	databases = options.database
+	for directory in options.directory:
+		databases += glob(directory + '/*.db')
+
+	state  = aprt.daemon.State(options.pkgbuild_dir, options.repository, options.check, databases, options.ignore_dir, options.jobs or None)
+	server = aprt.daemon.Server(options.socket, state)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		os.unlink(options.socket)
@@ -0,0 +1,142 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from glob import glob
+import os.path
+
+import aprt
+import aprt.daemon
+from   aprt.outdated import add_rebuilds, find_outdated, find_outdated_incremental
+from   aprt.repoadd  import installed_db_filename
+
+DESCRIPTION = 'List packages with dependencies that have been built after themselves.'
+
+def database_files(options):
+	repositories = list(options.repository)
+
+	# Add database in specified directories to database list.
+	for directory in options.directory:
+		repositories += glob(directory + '/*.db')
+	return repositories
+
+def load_and_find(options, ignore, session):
+	repositories = database_files(options)
+
+	# Read target repository and universe repositories.
+	check_repository     = session.database(options.check)
+	check_repository_dir = os.path.dirname(options.check)
+	if options.snapshot_dir is not None:
+		universe = aprt.Universe.load(repositories, mapped=True, snapshot_dir=options.snapshot_dir)
+	else:
+		universe = session.universe(repositories)
+	universe.add_layer(options.check, check_repository)
+
+	# Read the installed packages from the installed database next to the repository if there is one.
+	installed          = None
+	installed_filename = options.installed_db
+	if installed_filename is None:
+		try:
+			installed_filename = installed_db_filename(options.check)
+		except RuntimeError:
+			pass
+		if installed_filename is not None and not os.path.exists(installed_filename):
+			installed_filename = None
+	if installed_filename:
+		installed = session.database(installed_filename)
+		if options.verbose:
+			print("Using installed database: {}".format(installed_filename))
+
+	# Find outdated packages.
+	if options.verbose:
+		print("Packages to check: {}".format(len(check_repository)))
+	cache = session.archive_cache
+	if options.cache_file:
+		cache = aprt.alpm.PackageCache(options.cache_file)
+	elif options.cache:
+		cache = aprt.alpm.PackageCache(aprt.alpm.PackageCache.default_path(options.check))
+	with aprt.stats.span('list-outdated.find_outdated'):
+		if options.baseline and os.path.exists(options.baseline):
+			baseline, baseline_outdated = aprt.load_snapshot(options.baseline)
+			outdated = dict(find_outdated_incremental(check_repository, check_repository_dir, universe, ignore, not options.thorough, baseline, baseline_outdated, options.jobs or None, cache, installed))
+		else:
+			outdated = dict(find_outdated(check_repository, check_repository_dir, universe, ignore, not options.thorough, options.jobs or None, cache, installed))
+	if options.baseline:
+		aprt.save_snapshot(options.baseline, universe, outdated)
+	if cache is not None and cache is not session.archive_cache:
+		cache.evict_missing()
+		cache.close()
+
+	# Build reverse dependency list if needed.
+	if options.recursive:
+		add_rebuilds(outdated, check_repository, universe, ignore)
+
+	return outdated
+
+def add_arguments(parser):
+	parser.add_argument('-c', '--check',      dest='check',       required=True,       default=None,  help='The repository to check. Only packages in this repository will be scanned.')
+	parser.add_argument('-d', '--repository', dest='repository',  action='append',     default=[],    help='Add a database for package information.')
+	parser.add_argument('-s', '--sync',       dest='directory',   action='append',     default=[],    help='Add a directory of databases for package information.')
+	parser.add_argument('-v', '--verbose',    dest='verbose',     action='store_true', default=False, help='Show verbose output.')
+	parser.add_argument('-t', '--thorough',   dest='thorough',    action='store_true', default=False, help='Find all newer dependencies.')
+	parser.add_argument('-r', '--recursive',  dest='recursive',   action='store_true', default=False, help='List all packages depending on the found packages too.')
+	parser.add_argument('-i', '--ignore',     dest='ignore',      action='append',     default=[],    help='Ignore a package for listing newer reverse dependencies.')
+	parser.add_argument('--ignore-file',      dest='ignore_file', action='append',     default=[],    help='Ignore packages from a file.')
+	parser.add_argument('-j', '--jobs',       dest='jobs',        type=int,            default=1,     help='Read package archives with this many worker processes (0 to use all CPUs).')
+	parser.add_argument('--cache',            dest='cache',       action='store_true', default=False, help='Cache package archive metadata next to the checked repository database.')
+	parser.add_argument('--cache-file',       dest='cache_file',                       default=None,  help='Cache package archive metadata in the given file.')
+	parser.add_argument('--installed-db',     dest='installed_db',                     default=None,  help='Read the installed packages of built packages from this installed database.')
+	parser.add_argument('--no-installed-db',  dest='installed_db', action='store_const', const=False, help='Do not use the installed database next to the checked repository database.')
+	parser.add_argument('--snapshot-dir',     dest='snapshot_dir',                     default=None,  help='Load the databases through binary snapshots kept in this directory.')
+	parser.add_argument('--daemon',           dest='daemon',                           default=None,  help='Query an aprt-daemon listening on this socket instead of loading the data.')
+	parser.add_argument('--baseline',         dest='baseline',                         default=None,  help='Only re-check packages affected by changes since the snapshot in this file, and update it afterwards.')
+
+def run(options, session):
+	ignore = set(options.ignore)
+
+	# Add ignores from files.
+	for file in options.ignore_file:
+		with open(file, 'r') as file:
+			ignore.update([line.strip() for line in file if len(line.strip())])
+
+	if options.daemon:
+		aprt.daemon.refuse_options([
+			('--cache',        options.cache),
+			('--cache-file',   options.cache_file),
+			('--installed-db', options.installed_db),
+			('--snapshot-dir', options.snapshot_dir),
+			('--baseline',     options.baseline),
+		])
+		paths    = {'check': os.path.abspath(options.check), 'universe': [os.path.abspath(x) for x in database_files(options)]}
+		outdated = dict(aprt.daemon.query(options.daemon, 'outdated', paths, ignore=sorted(ignore), thorough=options.thorough, recursive=options.recursive))
+	else:
+		outdated = load_and_find(options, ignore, session)
+
+	# Print the packages.
+	for pkg, deps in outdated.items():
+		if options.verbose:
+			print('{} ({})'.format(pkg, ', '.join(map(lambda x: '{} {} -> {}'.format(*x), deps))))
+		else:
+			print(pkg)
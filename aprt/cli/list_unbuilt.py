@@ -0,0 +1,84 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import os
+
+import aprt
+import aprt.daemon
+from   aprt.unbuilt import build_waves, list_unbuilt, sort_buildorder
+
+DESCRIPTION = 'List unbuilt packages and/or their reverse dependencies.'
+
+def add_arguments(parser):
+	parser.add_argument('-p', '--pkgbuild-dir',    dest='pkgbuild_dir',                         required=True, help='The base path of the PKGBUILD and .SRCINFO directories.')
+	parser.add_argument('-r', '--repository',      dest='repository',      action='append',     required=True, help='The repository to search through for unbuilt packages.')
+	parser.add_argument('-d', '--reverse-deps',    dest='reverse_deps',    action='store_true',                help='Ouput the reverse dependencies of the unbuilt packages.')
+	parser.add_argument('-n', '--no-unbuilt',      dest='no_unbuilt',      action='store_true',                help='Do not output the unbuilt packages themselves (useful with -d).')
+	parser.add_argument('-w', '--allow-downgrade', dest='allow_downgrade', action='store_true',                help='Output downgraded packages.')
+	parser.add_argument('--waves',                 dest='waves',           action='store_true',                help='Group the output in waves that can be built concurrently, separated by an empty line.')
+	parser.add_argument('-j', '--jobs',            dest='jobs',            type=int,            default=1,     help='Parse .SRCINFO files with this many worker processes (0 to use all CPUs).')
+	parser.add_argument('--srcinfo-cache',         dest='srcinfo_cache',                        default=None,  help='Cache parsed .SRCINFO files in the given file.')
+	parser.add_argument('--ignore-dir',            dest='ignore_dir',      action='append',     default=[],    help='Do not search directories with this name for .SRCINFO files.')
+	parser.add_argument('--daemon',                dest='daemon',                               default=None,  help='Query an aprt-daemon listening on this socket instead of loading the data.')
+	parser.add_argument('-v', '--verbose',         dest='verbose',         action='store_true',                help='Show verbose output.')
+
+def load_and_list(options, session):
+	srcinfo_cache = aprt.SrcInfoCache(options.srcinfo_cache) if options.srcinfo_cache else None
+	srcinfo_db    = session.srcinfo_db(options.pkgbuild_dir, options.jobs or None, srcinfo_cache, set(options.ignore_dir))
+	if srcinfo_cache is not None:
+		srcinfo_cache.evict_missing()
+		srcinfo_cache.close()
+	database     = session.universe(options.repository)
+
+	duplicates   = database.duplicates()
+	if duplicates:
+		name = min(duplicates)
+		raise RuntimeError(f'Duplicate package in repositories: {name}')
+
+	output = list_unbuilt(srcinfo_db, database, options.reverse_deps, options.no_unbuilt, options.allow_downgrade)
+	if options.waves:
+		return build_waves(output, srcinfo_db.values())
+	return sort_buildorder(output, srcinfo_db.values())
+
+def run(options, session):
+	if options.daemon:
+		aprt.daemon.refuse_options([('--srcinfo-cache', options.srcinfo_cache)])
+		paths  = {
+			'pkgbuild_dir': os.path.abspath(options.pkgbuild_dir),
+			'repositories': [os.path.abspath(x) for x in options.repository],
+			'ignore_dirs':  options.ignore_dir,
+		}
+		result = aprt.daemon.query(options.daemon, 'unbuilt', paths, reverse_deps=options.reverse_deps, no_unbuilt=options.no_unbuilt, allow_downgrade=options.allow_downgrade, waves=options.waves)
+	else:
+		result = load_and_list(options, session)
+
+	if options.waves:
+		for index, wave in enumerate(result):
+			if index != 0: print()
+			for directory in wave: print(directory)
+	else:
+		for directory in result:
+			print(directory)
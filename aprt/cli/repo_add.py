@@ -0,0 +1,55 @@
+# Copyright 2017-2020 Fizyr B.V.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from aprt.repoadd import files_db_filename, index_installed, installed_db_filename, update_repository
+
+DESCRIPTION = 'Add package archives to or remove packages from a repository database and its files and installed databases.'
+
+def add_arguments(parser):
+	parser.add_argument('-r', '--repository',       dest='repository',    required=True,                          help='The repository database.')
+	parser.add_argument('-R', '--remove',           dest='remove',        action='append',     default=[],        help='Remove the named package from the repository (may be given multiple times).')
+	parser.add_argument('-v', '--verbose',          dest='verbose',       action='store_true',                    help='Print more information.')
+	parser.add_argument('-j', '--jobs',             dest='jobs',          type=int,            default=1,         help='Read package archives with this many worker processes (0 to use all CPUs).')
+	parser.add_argument('--no-files',               dest='files',         action='store_false',                   help='Do not update the files database.')
+	parser.add_argument('--no-installed',           dest='installed',     action='store_false',                   help='Do not update the installed database.')
+	parser.add_argument('--index-installed',        dest='index',         action='store_true',                    help='Also add packages already in the repository that are missing from the installed database.')
+	parser.add_argument('archives',                                       nargs='*',                              help='The package archives to add.')
+
+def run(options, session):
+	files_filename     = files_db_filename(options.repository) if options.files else None
+	installed_filename = installed_db_filename(options.repository) if options.installed else None
+	added, removed     = update_repository(options.repository, options.archives, options.remove, options.jobs or None, files_filename, installed_filename)
+	indexed            = []
+	if options.installed and options.index:
+		indexed = index_installed(options.repository, None, options.jobs or None, installed_filename)
+
+	if options.verbose:
+		for name in added:
+			print('added: {}'.format(name))
+		for name in removed:
+			print('removed: {}'.format(name))
+		for name in indexed:
+			print('indexed: {}'.format(name))
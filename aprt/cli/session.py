@@ -0,0 +1,87 @@
+# Copyright 2017-2020 Fizyr B.V.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import concurrent.futures
+import os
+
+from .. import alpm
+from .. import stats
+from ..srcinfo import SrcInfo, SrcInfoCache
+from ..universe import Universe
+
+class Session:
+	"""
+	The data loaded by the commands that run in one process.
+
+	Repository databases are kept and only read again when their size or modification time changed.
+	A shared session also keeps in-memory caches of parsed .SRCINFO files and package archive metadata,
+	so later commands only parse the files that changed in the meantime (for example by bump-pkgrel).
+	"""
+	def __init__(self, srcinfo_cache = None, archive_cache = None):
+		self.srcinfo_cache = srcinfo_cache
+		self.archive_cache = archive_cache
+		self.databases     = {}
+
+	@classmethod
+	def shared(cls):
+		""" Create a session with in-memory caches, for running several commands. """
+		return cls(SrcInfoCache(':memory:'), alpm.PackageCache(':memory:'))
+
+	def database(self, filename):
+		"""
+		Get the packages of a repository database file.
+		"""
+		stat   = os.stat(filename)
+		key    = (stat.st_size, stat.st_mtime_ns)
+		cached = self.databases.get(filename)
+		if cached is not None and cached[0] == key:
+			stats.count('session.database_hits')
+			return cached[1]
+		packages = alpm.read_package_db_file(filename)
+		self.databases[filename] = (key, packages)
+		return packages
+
+	def universe(self, filenames, jobs = None):
+		"""
+		Get a Universe with a layer for each repository database file, in the given order.
+		The files that are not loaded yet are read concurrently by a pool of threads.
+		"""
+		filenames = list(filenames)
+		with stats.span('session.universe'), concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+			repositories = list(executor.map(self.database, filenames))
+		return Universe(zip(filenames, repositories))
+
+	def srcinfo_db(self, root, jobs = 1, cache = None, ignore = ()):
+		"""
+		Load the .SRCINFO files under a directory indexed by package name.
+		The given cache is used if there is one, otherwise the cache of the session (if any).
+		"""
+		if cache is None: cache = self.srcinfo_cache
+		return SrcInfo.load_db_indexed_by_pkgname(root, jobs, cache, ignore)
+
+	def close(self):
+		if self.srcinfo_cache is not None: self.srcinfo_cache.close()
+		if self.archive_cache is not None: self.archive_cache.close()
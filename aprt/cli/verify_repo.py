@@ -0,0 +1,65 @@
+# Copyright 2017-2020 Fizyr B.V.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from aprt import stats
+from aprt.verify import HashCache, verify_repository_file
+
+DESCRIPTION = 'Verify the package archives of a repository against the sizes and checksums in its database.'
+
+def add_arguments(parser):
+	parser.add_argument('-r', '--repository',       dest='repository',    required=True,                          help='The repository database.')
+	parser.add_argument('-v', '--verbose',          dest='verbose',       action='store_true',                    help='Print more information.')
+	parser.add_argument('-j', '--jobs',             dest='jobs',          type=int,            default=1,         help='Hash package archives with this many worker threads (0 to use all CPUs).')
+	parser.add_argument('--no-extra',               dest='extra',         action='store_false',                   help='Do not report package archives that are not in the repository database.')
+	parser.add_argument('--cache',                  dest='cache',         action='store_true',                    help='Cache archive checksums next to the repository database.')
+	parser.add_argument('--cache-file',             dest='cache_file',                         default=None,      help='Cache archive checksums in the given file.')
+
+def run(options, session):
+	cache = None
+	if options.cache_file:
+		cache = HashCache(options.cache_file)
+	elif options.cache:
+		cache = HashCache(HashCache.default_path(options.repository))
+
+	with stats.span('verify-repo.verify'):
+		result = verify_repository_file(options.repository, options.jobs or None, cache, options.extra)
+
+	if cache is not None:
+		cache.evict_missing()
+		cache.close()
+
+	for filename in sorted(result.missing):
+		print('missing: {}'.format(filename))
+	for filename in sorted(result.extra):
+		print('extra: {}'.format(filename))
+	for filename, (expected, actual) in sorted(result.size_mismatch.items()):
+		print('size mismatch: {} (expected {}, found {})'.format(filename, expected, actual))
+	for filename, (expected, actual) in sorted(result.checksum_mismatch.items()):
+		print('checksum mismatch: {} (expected {}, found {})'.format(filename, expected, actual))
+	if options.verbose:
+		print('verified: {}'.format(result.verified))
+
+	return 0 if result.ok() else 1
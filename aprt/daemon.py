@@ -0,0 +1,406 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+A long-running query daemon that keeps repositories and SRCINFO files loaded in memory.
+
+The daemon serves queries over a Unix socket using one JSON object per line.
+A request looks like {"query": "unbuilt", "args": {...}, "paths": {...}},
+a response like {"ok": true, "result": ...} or {"ok": false, "error": "..."}.
+The optional paths name the files the client would have loaded itself,
+queries are refused if they differ from the files the daemon was started with.
+
+Before each query the daemon refreshes its state. Files are only reloaded when they changed.
+If inotify is available, only the files and directories named in inotify events are reloaded.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+
+from . import alpm
+from . import outdated
+from . import stats
+from . import unbuilt
+from .package import dependency_graph, search_reverse_dependencies
+from .srcinfo import SrcInfo
+from .universe import Universe
+
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW  = 0x00004000
+IN_ONLYDIR     = 0x01000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+
+_EVENT = struct.Struct('iIII')
+
+class Inotify:
+	"""
+	A minimal non-blocking inotify wrapper using ctypes.
+	Raises OSError if inotify is not available.
+	"""
+	def __init__(self):
+		libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+		if not hasattr(libc, 'inotify_init1'): raise OSError('inotify is not available')
+		self.libc    = libc
+		self.fd      = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		self.watches = {}
+		if self.fd < 0:
+			errno = ctypes.get_errno()
+			raise OSError(errno, os.strerror(errno))
+
+	def add_watch(self, path, mask = WATCH_MASK):
+		wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+		if wd < 0:
+			errno = ctypes.get_errno()
+			raise OSError(errno, os.strerror(errno), path)
+		self.watches[wd] = path
+
+	def read_events(self):
+		"""
+		Read all pending events without blocking.
+		Returns a list of (directory, name, mask) tuples.
+		An overflowed event queue is reported with directory set to None.
+		"""
+		result = []
+		while True:
+			try:
+				data = os.read(self.fd, 65536)
+			except BlockingIOError:
+				return result
+			offset = 0
+			while offset < len(data):
+				wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+				offset += _EVENT.size
+				name    = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+				offset += length
+				if mask & IN_Q_OVERFLOW:
+					result.append((None, name, mask))
+				elif wd in self.watches:
+					result.append((self.watches[wd], name, mask))
+					if mask & IN_DELETE_SELF: del self.watches[wd]
+
+	def close(self):
+		os.close(self.fd)
+
+def _abspath(path):
+	return os.path.abspath(path) if path is not None else None
+
+def _mtime(path):
+	try:
+		return os.stat(path).st_mtime_ns
+	except FileNotFoundError:
+		return None
+
+class State:
+	"""
+	The loaded repositories and SRCINFO files of a daemon.
+
+	repositories are the databases used for unbuilt and reverse dependency queries,
+	check and universe are the checked repository and the additional databases for outdated queries.
+	"""
+	def __init__(self, pkgbuild_dir = None, repositories = (), check = None, universe = (), ignore_dirs = (), jobs = 1):
+		self.pkgbuild_dir = pkgbuild_dir
+		self.repositories = list(repositories)
+		self.check        = check
+		self.universe     = list(universe)
+		self.ignore_dirs  = set(ignore_dirs)
+		self.jobs         = jobs
+
+		self.databases     = {}
+		self.srcinfos      = {}
+		self.derived       = {}
+		self.archive_cache = alpm.PackageCache(':memory:')
+
+		try:
+			self.inotify = Inotify()
+		except OSError:
+			self.inotify = None
+		self.watched = set()
+
+		self.refresh_databases()
+		self.refresh_srcinfo()
+
+	def check_paths(self, pkgbuild_dir = None, repositories = None, check = None, universe = None, ignore_dirs = None):
+		"""
+		Raise RuntimeError if the paths of a query differ from the paths the daemon was started with.
+		Paths that are None are not checked.
+		"""
+		mismatch = []
+		if pkgbuild_dir is not None and _abspath(pkgbuild_dir) != _abspath(self.pkgbuild_dir):
+			mismatch.append('PKGBUILD directory')
+		if repositories is not None and list(map(_abspath, repositories)) != list(map(_abspath, self.repositories)):
+			mismatch.append('repositories')
+		if check is not None and _abspath(check) != _abspath(self.check):
+			mismatch.append('checked repository')
+		if universe is not None and list(map(_abspath, universe)) != list(map(_abspath, self.universe)):
+			mismatch.append('databases')
+		if ignore_dirs is not None and set(ignore_dirs) != self.ignore_dirs:
+			mismatch.append('ignored directories')
+		if mismatch:
+			raise RuntimeError('The daemon was started with different {}.'.format(', '.join(mismatch)))
+
+	def database_files(self):
+		files = self.repositories + self.universe
+		if self.check is not None: files.append(self.check)
+		return list(dict.fromkeys(files))
+
+	def watch(self, directory):
+		if self.inotify is None or directory in self.watched: return
+		try:
+			self.inotify.add_watch(directory)
+			self.watched.add(directory)
+		except OSError:
+			pass
+
+	def refresh_databases(self):
+		"""
+		Reload the database files that changed since they were loaded.
+		"""
+		changed = False
+		for filename in self.database_files():
+			self.watch(os.path.dirname(os.path.abspath(filename)))
+			mtime = _mtime(filename)
+			if filename in self.databases and self.databases[filename][0] == mtime: continue
+			self.databases[filename] = (mtime, alpm.read_package_db_file(filename))
+			stats.count('daemon.databases_reloaded')
+			changed = True
+		if changed: self.derived.clear()
+
+	def walk(self, root):
+		"""
+		Walk a directory tree, watching all directories.
+		Yields the path of every .SRCINFO file.
+		"""
+		self.watch(root)
+		try:
+			with os.scandir(root) as entries:
+				children = list(entries)
+		except (FileNotFoundError, NotADirectoryError):
+			return
+		for child in children:
+			if child.name == '.SRCINFO':
+				yield child.path
+			elif child.name not in self.ignore_dirs and child.is_dir():
+				yield from self.walk(child.path)
+
+	def reload_srcinfo(self, filename):
+		"""
+		Re-parse a .SRCINFO file if it changed since it was parsed, or forget it if it no longer exists.
+		Returns True if anything changed.
+		"""
+		mtime = _mtime(filename)
+		if mtime is None: return self.srcinfos.pop(filename, None) is not None
+		if filename in self.srcinfos and self.srcinfos[filename][0] == mtime: return False
+		self.srcinfos[filename] = (mtime, SrcInfo.parse_file(filename))
+		stats.count('daemon.srcinfo_reparsed')
+		return True
+
+	def refresh_srcinfo(self, root = None):
+		"""
+		Re-parse the .SRCINFO files that changed since they were parsed.
+		If root is given, only the directory tree at root is rescanned instead of the whole PKGBUILD tree.
+		"""
+		if self.pkgbuild_dir is None: return
+		if root is None: root = self.pkgbuild_dir
+		found   = set()
+		changed = False
+		for filename in self.walk(root):
+			found.add(filename)
+			changed |= self.reload_srcinfo(filename)
+		prefix = os.path.join(root, '')
+		for filename in [x for x in self.srcinfos if x.startswith(prefix) and x not in found]:
+			del self.srcinfos[filename]
+			changed = True
+		if changed: self.derived.clear()
+
+	def refresh(self):
+		"""
+		Refresh the state, using inotify events if available.
+		"""
+		if self.inotify is None:
+			self.refresh_databases()
+			self.refresh_srcinfo()
+			return
+
+		databases     = False
+		rescan        = False
+		srcinfo_paths = set()
+		database_dirs = {os.path.dirname(os.path.abspath(x)) for x in self.database_files()}
+		pkgbuild_dir  = os.path.abspath(self.pkgbuild_dir) if self.pkgbuild_dir is not None else None
+		for directory, name, mask in self.inotify.read_events():
+			if directory is None:
+				databases = rescan = True
+				continue
+			if mask & IN_DELETE_SELF: self.watched.discard(directory)
+			path = os.path.abspath(directory)
+			if path in database_dirs: databases = True
+			if pkgbuild_dir is not None and (path == pkgbuild_dir or path.startswith(pkgbuild_dir + os.sep)):
+				# The event names the changed entry of the watched directory, only that entry needs to be reloaded.
+				if name in self.ignore_dirs: continue
+				srcinfo_paths.add(os.path.join(directory, name) if name else directory)
+		if databases: self.refresh_databases()
+		if rescan:
+			self.refresh_srcinfo()
+			return
+
+		changed = False
+		for path in sorted(srcinfo_paths):
+			if os.path.basename(path) == '.SRCINFO':
+				changed |= self.reload_srcinfo(path)
+			else:
+				self.refresh_srcinfo(path)
+		if changed: self.derived.clear()
+
+	def cached(self, key, compute):
+		if key not in self.derived:
+			self.derived[key] = compute()
+		return self.derived[key]
+
+	def srcinfo_db(self):
+		return self.cached('srcinfo_db', lambda: SrcInfo.index_by_pkgname({os.path.dirname(x): srcinfo for x, (_, srcinfo) in self.srcinfos.items()}))
+
+	def repository_universe(self):
+		return self.cached('repositories', lambda: Universe((x, self.databases[x][1]) for x in self.repositories))
+
+	def outdated_universe(self):
+		def compute():
+			result = Universe((x, self.databases[x][1]) for x in self.universe)
+			result.add_layer(self.check, self.databases[self.check][1])
+			return result
+		return self.cached('universe', compute)
+
+	def srcinfo_package_graph(self):
+		return self.cached('srcinfo_package_graph', lambda: unbuilt.srcinfo_package_graph(self.srcinfo_db()))
+
+def query_unbuilt(state, reverse_deps = False, no_unbuilt = False, allow_downgrade = False, waves = False):
+	srcinfo_db = state.srcinfo_db()
+	database   = state.repository_universe()
+	duplicates = database.duplicates()
+	if duplicates:
+		name = min(duplicates)
+		raise RuntimeError(f'Duplicate package in repositories: {name}')
+
+	package_graph = state.srcinfo_package_graph() if reverse_deps else None
+	output = unbuilt.list_unbuilt(srcinfo_db, database, reverse_deps, no_unbuilt, allow_downgrade, package_graph)
+	if waves: return unbuilt.build_waves(output, srcinfo_db.values())
+	return list(unbuilt.sort_buildorder(output, srcinfo_db.values()))
+
+def query_outdated(state, ignore = (), thorough = False, recursive = False):
+	if state.check is None: raise RuntimeError('The daemon has no repository to check.')
+	ignore     = set(ignore)
+	repository = state.databases[state.check][1]
+	universe   = state.outdated_universe()
+	result     = dict(outdated.find_outdated(repository, os.path.dirname(state.check), universe, ignore, not thorough, state.jobs, state.archive_cache))
+	if recursive: outdated.add_rebuilds(result, repository, universe, ignore)
+	return [[name, [[dep, str(old), str(new)] for dep, old, new in deps]] for name, deps in result.items()]
+
+def query_reverse_deps(state, packages, recursive = True, depth = None, ignore = ()):
+	graph  = state.cached('repository_graph', lambda: dependency_graph(state.repository_universe().values()))
+	ignore = set(ignore)
+	return {name: sorted(search_reverse_dependencies(graph, [name], recursive, depth, ignore)) for name in packages}
+
+QUERIES = {
+	'ping':         lambda state: 'pong',
+	'unbuilt':      query_unbuilt,
+	'outdated':     query_outdated,
+	'reverse-deps': query_reverse_deps,
+}
+
+class _Handler(socketserver.StreamRequestHandler):
+	def handle(self):
+		for line in self.rfile:
+			try:
+				request = json.loads(line)
+				query   = QUERIES[request['query']]
+				self.server.state.check_paths(**request.get('paths', {}))
+				self.server.state.refresh()
+				response = {'ok': True, 'result': query(self.server.state, **request.get('args', {}))}
+			except Exception as error:
+				response = {'ok': False, 'error': '{}: {}'.format(type(error).__name__, error)}
+			self.wfile.write(json.dumps(response).encode() + b'\n')
+			self.wfile.flush()
+
+class Server(socketserver.UnixStreamServer):
+	"""
+	A Unix socket server answering queries about a daemon State.
+	Queries are handled one at a time.
+	The socket is only accessible by its owner unless a different mode is given.
+	"""
+	def __init__(self, path, state, mode = 0o600):
+		# Replace a stale socket from an earlier daemon, but never any other file.
+		try:
+			if not stat.S_ISSOCK(os.lstat(path).st_mode):
+				raise RuntimeError(f'refusing to replace {path}: it is not a socket')
+			os.unlink(path)
+		except FileNotFoundError:
+			pass
+		self.mode = mode
+		super().__init__(path, _Handler)
+		self.state = state
+
+	def server_bind(self):
+		# Bind with a umask that gives the socket its mode right away, so it is never accessible to others.
+		umask = os.umask(0o777 & ~self.mode)
+		try:
+			super().server_bind()
+		finally:
+			os.umask(umask)
+
+def refuse_options(options):
+	"""
+	Raise RuntimeError if any command line option that a daemon query can not honour is set.
+	The options are given as (flag, value) tuples.
+	"""
+	used = [flag for flag, value in options if value]
+	if used: raise RuntimeError('{} can not be used with --daemon.'.format(', '.join(used)))
+
+def query(path, name, paths = None, **args):
+	"""
+	Send a query to a daemon listening on a Unix socket and return the result.
+	If paths is given, the daemon refuses the query unless it was started with the same paths, see State.check_paths().
+	Raises RuntimeError if the daemon reported an error.
+	"""
+	request = {'query': name, 'args': args}
+	if paths is not None: request['paths'] = paths
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+		connection.connect(path)
+		connection.sendall(json.dumps(request).encode() + b'\n')
+		with connection.makefile('rb') as file:
+			response = json.loads(file.readline())
+	if not response['ok']: raise RuntimeError(response['error'])
+	return response['result']
@@ -0,0 +1,500 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import array
+import heapq
+
+from . import stats
+
+class _Rows:
+	"""
+	A read-only sequence of the rows of a graph in compressed sparse row form.
+	Row i holds the node ids targets[offsets[i]:offsets[i + 1]].
+	"""
+	__slots__ = ('offsets', 'targets')
+
+	def __init__(self, offsets, targets):
+		self.offsets = offsets
+		self.targets = targets
+
+	def __len__(self):
+		return len(self.offsets) - 1
+
+	def __getitem__(self, id):
+		return self.targets[self.offsets[id]:self.offsets[id + 1]]
+
+def _transpose(count, offsets, targets):
+	""" Compute the compressed sparse rows of the reverse edges with a counting sort. """
+	reverse_offsets = array.array('I', [0]) * (count + 1)
+	for target in targets:
+		reverse_offsets[target + 1] += 1
+	for id in range(count):
+		reverse_offsets[id + 1] += reverse_offsets[id]
+
+	position        = reverse_offsets[:-1]
+	reverse_targets = array.array('I', [0]) * len(targets)
+	for source in range(count):
+		for target in targets[offsets[source]:offsets[source + 1]]:
+			reverse_targets[position[target]] = source
+			position[target] += 1
+	return reverse_offsets, reverse_targets
+
+class DependencyGraph:
+	"""
+	A dependency graph with integer node ids.
+
+	graph.names holds the name of each node and graph.ids the id of each name.
+	The edges from a node to its dependencies and from a node to its dependents
+	are stored in compressed sparse row form in arrays of unsigned 32 bit integers,
+	so large graphs take little memory and the algorithms do not hash strings.
+	graph.forward and graph.backward give the neighbour ids of each node as a sequence of rows.
+
+	What a node is depends on the builder: package.dependency_graph() has a node for each package and each dependency name,
+	unbuilt.srcinfo_graph() has a node for each directory with a .SRCINFO file.
+	"""
+	def __init__(self, names, offsets, targets, reverse = None):
+		self.names   = names
+		self.ids     = {name: id for id, name in enumerate(names)}
+		self.offsets = offsets
+		self.targets = targets
+		if reverse is None: reverse = _transpose(len(names), offsets, targets)
+		self.reverse_offsets, self.reverse_targets = reverse
+
+	@classmethod
+	def from_rows(cls, names, rows):
+		"""
+		Create a graph from a list of names and an iterable with the neighbour ids of each node.
+		The rows are consumed one at a time, so they can be generated on the fly (and names added meanwhile).
+		Nodes after the last row have no edges.
+		"""
+		offsets = array.array('I', [0])
+		targets = array.array('I')
+		for row in rows:
+			targets.extend(row)
+			offsets.append(len(targets))
+		offsets.extend([len(targets)] * (len(names) + 1 - len(offsets)))
+		return cls(names, offsets, targets)
+
+	@classmethod
+	def from_neighbours(cls, neighbours):
+		"""
+		Create a graph from a neighbour table: a dictionary of the neighbour names of each name.
+		"""
+		names, adjacency = index_neighbours(neighbours)
+		return cls.from_rows(names, adjacency)
+
+	@property
+	def forward(self):
+		return _Rows(self.offsets, self.targets)
+
+	@property
+	def backward(self):
+		return _Rows(self.reverse_offsets, self.reverse_targets)
+
+	def reversed(self):
+		"""
+		Get the graph with all edges reversed. The arrays are shared, not copied.
+		"""
+		result = self.__class__.__new__(self.__class__)
+		result.names           = self.names
+		result.ids             = self.ids
+		result.offsets         = self.reverse_offsets
+		result.targets         = self.reverse_targets
+		result.reverse_offsets = self.offsets
+		result.reverse_targets = self.targets
+		return result
+
+	def with_nodes(self, names):
+		"""
+		Get a copy of the graph with nodes without edges added for the names that are not in it yet.
+		"""
+		missing = [name for name in dict.fromkeys(names) if name not in self.ids]
+		if not missing: return self
+		padding = array.array('I', [len(self.targets)]) * len(missing)
+		reverse = (self.reverse_offsets + padding, self.reverse_targets)
+		return self.__class__(self.names + missing, self.offsets + padding, self.targets, reverse)
+
+	def __len__(self):
+		return len(self.names)
+
+	def __contains__(self, name):
+		return name in self.ids
+
+	def __iter__(self):
+		return iter(self.names)
+
+	def edge_count(self):
+		return len(self.targets)
+
+	def dependencies(self, name):
+		""" Get the set of names of the direct dependencies of a node. """
+		id = self.ids[name]
+		return {self.names[x] for x in self.targets[self.offsets[id]:self.offsets[id + 1]]}
+
+	def dependents(self, name):
+		""" Get the set of names of the direct dependents of a node. """
+		id = self.ids[name]
+		return {self.names[x] for x in self.reverse_targets[self.reverse_offsets[id]:self.reverse_offsets[id + 1]]}
+
+	def table(self):
+		""" Convert the graph to a neighbour table with a set of dependency names for each name. """
+		return {name: {self.names[x] for x in row} for name, row in zip(self.names, self.forward)}
+
+	def _search(self, offsets, targets, seeds, depth, ignore):
+		names   = self.names
+		ignored = bytearray(len(names))
+		for name in ignore:
+			id = self.ids.get(name)
+			if id is not None: ignored[id] = 1
+		visited  = bytearray(len(names))
+		found    = bytearray(len(names))
+		result   = []
+		frontier = []
+		for name in seeds:
+			id = self.ids.get(name)
+			if id is not None and not visited[id]:
+				visited[id] = 1
+				frontier.append(id)
+
+		level = 0
+		while frontier and (depth is None or level < depth):
+			next_frontier = []
+			for id in frontier:
+				for index in range(offsets[id], offsets[id + 1]):
+					neighbour = targets[index]
+					if ignored[neighbour]: continue
+					if not found[neighbour]:
+						found[neighbour] = 1
+						result.append(neighbour)
+					if not visited[neighbour]:
+						visited[neighbour] = 1
+						next_frontier.append(neighbour)
+			frontier = next_frontier
+			level   += 1
+		return {names[id] for id in result}
+
+	def search_dependencies(self, seeds, depth = None, ignore = ()):
+		"""
+		Find the dependencies of a set of seed names, visiting only the part of the graph reachable from the seeds.
+		If depth is given, the search stops after that many levels.
+		Names in ignore are not reported and not searched through.
+		A seed is only part of the result if it is a dependency of a seed itself.
+		"""
+		return self._search(self.offsets, self.targets, seeds, depth, ignore)
+
+	def search_dependents(self, seeds, depth = None, ignore = ()):
+		"""
+		Find the dependents of a set of seed names.
+		See search_dependencies().
+		"""
+		return self._search(self.reverse_offsets, self.reverse_targets, seeds, depth, ignore)
+
+	def reachability(self):
+		"""
+		Compute the transitive closure of the graph.
+		Returns a list with a bitset (as int) of the ids of the dependencies of each node, see reachability_rows().
+		"""
+		return reachability_rows(self.forward)
+
+	def reachability_table(self, names = None):
+		"""
+		Compute the transitive dependencies of each node as a dictionary of sets of names.
+		If names is given, only those nodes are included.
+		"""
+		rows = self.reachability()
+		if names is None: names = self.names
+		return {name: {self.names[x] for x in bits_to_ids(rows[self.ids[name]])} for name in names}
+
+	def __repr__(self):
+		return '{{DependencyGraph: nodes: {}, edges: {}}}'.format(len(self.names), len(self.targets))
+
+def index_neighbours(neighbours):
+	"""
+	Convert a neighbour table to integer form.
+	Returns a tuple (names, adjacency) where names is a list of all nodes
+	and adjacency holds the list of neighbour ids for each node.
+	Nodes that only appear as neighbour are added after the keys of the table.
+	"""
+	names = list(neighbours)
+	ids   = {name: id for id, name in enumerate(names)}
+	adjacency = []
+	for name in neighbours:
+		row = []
+		for neighbour in neighbours[name]:
+			if neighbour not in ids:
+				ids[neighbour] = len(names)
+				names.append(neighbour)
+			row.append(ids[neighbour])
+		adjacency.append(row)
+	adjacency += [[] for _ in range(len(names) - len(adjacency))]
+	return names, adjacency
+
+def strongly_connected_components(adjacency):
+	"""
+	Find the strongly connected components of a graph in integer form.
+	The components are returned as lists of node ids in reverse topological order:
+	each component comes after all components reachable from it.
+	"""
+	count     = len(adjacency)
+	index     = [-1] * count
+	low       = [0] * count
+	on_stack  = [False] * count
+	stack     = []
+	result    = []
+	counter   = 0
+
+	for root in range(count):
+		if index[root] >= 0: continue
+
+		# Iterative version of Tarjan's algorithm, each work item is a node and the next edge to visit.
+		work = [(root, 0)]
+		while work:
+			node, edge = work.pop()
+			if edge == 0:
+				index[node]    = counter
+				low[node]      = counter
+				counter       += 1
+				on_stack[node] = True
+				stack.append(node)
+
+			edges   = adjacency[node]
+			recurse = False
+			while edge < len(edges):
+				child = edges[edge]
+				edge += 1
+				if index[child] < 0:
+					work.append((node, edge))
+					work.append((child, 0))
+					recurse = True
+					break
+				elif on_stack[child]:
+					low[node] = min(low[node], index[child])
+			if recurse: continue
+
+			if low[node] == index[node]:
+				component = []
+				while True:
+					member = stack.pop()
+					on_stack[member] = False
+					component.append(member)
+					if member == node: break
+				result.append(component)
+
+			if work:
+				parent = work[-1][0]
+				low[parent] = min(low[parent], low[node])
+
+	return result
+
+def reachability_rows(adjacency):
+	"""
+	Compute the transitive closure of a graph in integer form.
+	Returns a list with a bitset (as int) of the reachable node ids for each node.
+	A node only reaches itself if it is part of a cycle.
+	"""
+	with stats.span('graph.reachability'):
+		return _reachability_rows(adjacency)
+
+def _reachability_rows(adjacency):
+	components   = strongly_connected_components(adjacency)
+	component_of = [0] * len(adjacency)
+	members      = []
+	for id, component in enumerate(components):
+		bits = 0
+		for node in component:
+			component_of[node] = id
+			bits |= 1 << node
+		members.append(bits)
+
+	# Components are in reverse topological order, so all successors are done before their predecessors.
+	reach = [0] * len(components)
+	for id, component in enumerate(components):
+		bits   = 0
+		cyclic = len(component) > 1
+		for node in component:
+			for child in adjacency[node]:
+				target = component_of[child]
+				if target == id:
+					cyclic = True
+				else:
+					bits |= reach[target] | members[target]
+		if cyclic: bits |= members[id]
+		reach[id] = bits
+
+	return [reach[component_of[node]] for node in range(len(adjacency))]
+
+def bits_to_ids(bits):
+	""" Generate the ids of the set bits in a bitset. """
+	while bits:
+		low   = bits & -bits
+		bits ^= low
+		yield low.bit_length() - 1
+
+def reachability_table(neighbours):
+	"""
+	Build a reachability table from a neighbour table or a DependencyGraph.
+	The neighbour table is not modified.
+	"""
+	if isinstance(neighbours, DependencyGraph): return neighbours.reachability_table()
+	graph = DependencyGraph.from_neighbours(neighbours)
+	return graph.reachability_table(neighbours)
+
+class DependencyCycleError(RuntimeError):
+	"""
+	Raised when no build order exists because of dependency cycles.
+	error.cycles holds the sorted members of each offending strongly connected component.
+	"""
+	def __init__(self, cycles):
+		self.cycles = cycles
+		description = '; '.join(', '.join(cycle) for cycle in cycles)
+		super().__init__(f'Dependency cycle detected, unable to determine build order. The following cycles exist: {description}.')
+
+class _BuildGraph:
+	"""
+	The dependencies between a set of nodes, including indirect dependencies through other nodes.
+
+	Kahn's algorithm runs on the condensation of the part of the graph reachable from the selected nodes.
+	Components without selected nodes are finished as soon as their dependencies are,
+	so they pass dependencies through without ever being built.
+	"""
+	def __init__(self, neighbours, nodes):
+		with stats.span('graph.build_graph'):
+			self._build(neighbours, nodes)
+
+	def _build(self, neighbours, nodes):
+		if not isinstance(neighbours, DependencyGraph): neighbours = DependencyGraph.from_neighbours(neighbours)
+		graph     = neighbours.with_nodes(nodes)
+		ids       = graph.ids
+		adjacency = graph.forward
+
+		self.names = graph.names
+		self.nodes = sorted(nodes)
+
+		# Restrict the graph to the nodes reachable from the selected nodes, using local ids.
+		local = {}
+		order = []
+		stack = [ids[node] for node in self.nodes]
+		while stack:
+			id = stack.pop()
+			if id in local: continue
+			local[id] = len(order)
+			order.append(id)
+			stack.extend(adjacency[id])
+		self.order     = order
+		self.adjacency = [[local[x] for x in adjacency[id]] for id in order]
+
+		# Condense the cycles, remembering which component holds which selected node.
+		self.components = strongly_connected_components(self.adjacency)
+		component_of    = [0] * len(order)
+		for component, members in enumerate(self.components):
+			for member in members: component_of[member] = component
+
+		self.selected  = [None] * len(self.components)
+		self.component = []
+		for index, node in enumerate(self.nodes):
+			self.selected[component_of[local[ids[node]]]] = index
+			self.component.append(component_of[local[ids[node]]])
+
+		self.indegree   = [0] * len(self.components)
+		self.dependents = [[] for _ in self.components]
+		for component, members in enumerate(self.components):
+			depends = {component_of[x] for member in members for x in self.adjacency[member]}
+			if component in depends:
+				depends.discard(component)
+				# A cycle with selected nodes can never be built, so it never becomes ready.
+				if self.selected[component] is not None: self.indegree[component] += 1
+			self.indegree[component] += len(depends)
+			for dependency in depends:
+				self.dependents[dependency].append(component)
+
+		self.initial = []
+		for component in [x for x, indegree in enumerate(self.indegree) if indegree == 0]:
+			if self.selected[component] is None: self.initial.extend(self._finish(component))
+			else: self.initial.append(self.selected[component])
+		self.initial.sort()
+
+	def _finish(self, component):
+		stack = [component]
+		while stack:
+			for dependent in self.dependents[stack.pop()]:
+				self.indegree[dependent] -= 1
+				if self.indegree[dependent] != 0: continue
+				if self.selected[dependent] is None: stack.append(dependent)
+				else: yield self.selected[dependent]
+
+	def ready(self):
+		return list(self.initial)
+
+	def finish(self, index):
+		""" Mark a node as built and return the nodes that became ready. """
+		return self._finish(self.component[index])
+
+	def cycle_error(self, done):
+		stuck = {self.nodes[index] for index in range(len(self.nodes)) if index not in done}
+		cycles = []
+		for component in self.components:
+			if len(component) == 1 and component[0] not in self.adjacency[component[0]]: continue
+			members = sorted(self.names[self.order[x]] for x in component)
+			if stuck.intersection(members): cycles.append(members)
+		return DependencyCycleError(sorted(cycles))
+
+def build_order(neighbours, nodes):
+	"""
+	Generate a build order for a set of nodes from a dependency neighbour table or a DependencyGraph.
+	Nodes are ordered after all nodes they depend on, directly or through other nodes in the table.
+	Of the nodes that can be built, the lowest sorting one comes first.
+	Raises DependencyCycleError when the remaining nodes all depend on a cycle.
+	"""
+	graph = _BuildGraph(neighbours, nodes)
+	heap  = graph.ready()
+	done  = set()
+	while heap:
+		index = heapq.heappop(heap)
+		done.add(index)
+		yield graph.nodes[index]
+		for ready in graph.finish(index):
+			heapq.heappush(heap, ready)
+	if len(done) != len(graph.nodes):
+		raise graph.cycle_error(done)
+
+def build_waves(neighbours, nodes):
+	"""
+	Group a set of nodes into waves that can be built concurrently, see build_order().
+	Each wave only depends on nodes in earlier waves.
+	The waves are returned as a list of sorted lists.
+	Raises DependencyCycleError when the remaining nodes all depend on a cycle.
+	"""
+	graph  = _BuildGraph(neighbours, nodes)
+	wave   = graph.ready()
+	done   = set()
+	result = []
+	while wave:
+		result.append([graph.nodes[index] for index in wave])
+		done.update(wave)
+		wave = sorted(ready for index in wave for ready in graph.finish(index))
+	if len(done) != len(graph.nodes):
+		raise graph.cycle_error(done)
+	return result
@@ -0,0 +1,329 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+# A binary snapshot format for parsed repository databases that is loaded with mmap.
+#
+# A snapshot consists of a header followed by a number of tables of native unsigned 32 bit integers
+# and a string table holding every distinct string once:
+#   packages:       (name, first field, field count) for each package, sorted by name
+#   fields:         (key, first value, value count, first dependency) for each field of each package
+#   values:         a string for each value
+#   dependencies:   (name, constraint, version) for each value of the dependency fields
+#   provides:       (provided name, package) for each explicit provide of each package, sorted by provided name
+#   string offsets: the offset of each string in the string data, plus the end of the last string
+# Strings are referred to by their index in the string table.
+# Missing values are stored as NONE.
+
+import array
+import collections.abc
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from . import alpm
+from . import stats
+from .package import Constraint, Dependency, Package
+from .version import Version
+
+# The magic bytes include the byte order of the tables, so snapshots from other machines are regenerated.
+MAGIC         = b'APRTMAP' + (b'L' if sys.byteorder == 'little' else b'B')
+FORMAT        = 2
+NONE          = 0xffffffff
+PACKAGE_WIDTH = 3
+FIELD_WIDTH   = 4
+DEP_WIDTH     = 3
+PROVIDE_WIDTH = 2
+
+# magic, format, package count, source size, source mtime, table offsets
+HEADER = struct.Struct('<8sIIQq7Q')
+
+# Fields for which the parsed dependencies are stored in the snapshot.
+DEPENDENCY_FIELDS = frozenset(('depends', 'optdepends', 'makedepends', 'checkdepends', 'conflicts', 'replaces', 'provides'))
+
+def default_path(db_filename, directory = None):
+	"""
+	Get the default location of the snapshot of a repository database.
+	Without a directory, the snapshot is stored next to the database.
+	Otherwise it is stored in the directory under a name derived from the full path of the database.
+	"""
+	if directory is None: return db_filename + '.snapshot'
+	path = os.path.abspath(db_filename)
+	tag  = hashlib.sha1(path.encode()).hexdigest()[:16]
+	return os.path.join(directory, '{}-{}.snapshot'.format(os.path.basename(path), tag))
+
+def _parse_dependencies(values):
+	try:
+		return [Dependency.parse(value) for value in values]
+	except ValueError:
+		return None
+
+def save_mapped_repository(filename, packages, source_size = 0, source_mtime = 0):
+	"""
+	Save a dictionary of packages as binary snapshot.
+	The size and modification time of the source database are stored to detect when the snapshot is stale.
+	The snapshot is written to a temporary file that replaces the target when it is complete.
+	"""
+	strings    = {}
+	string_ids = []
+
+	def intern(string):
+		if string is None: return NONE
+		try:
+			return strings[string]
+		except KeyError:
+			strings[string] = len(string_ids)
+			string_ids.append(string)
+			return strings[string]
+
+	package_table = array.array('I')
+	field_table   = array.array('I')
+	value_table   = array.array('I')
+	dep_table     = array.array('I')
+	provides      = []
+
+	with stats.span('mapped.save'):
+		for index, name in enumerate(sorted(packages, key=lambda name: name.encode())):
+			package = packages[name]
+			fields  = [(key, values) for key, values in package.data.items() if key != 'pkgname']
+			package_table.extend((intern(name), len(field_table) // FIELD_WIDTH, len(fields)))
+			for key, values in fields:
+				deps      = _parse_dependencies(values) if key in DEPENDENCY_FIELDS else None
+				first_dep = len(dep_table) // DEP_WIDTH if deps is not None else NONE
+				field_table.extend((intern(key), len(value_table), len(values), first_dep))
+				value_table.extend(intern(value) for value in values)
+				if key == 'provides':
+					provides.extend((dep.name.encode(), index) for dep in deps or () if dep.name != name)
+				for value, dep in zip(values, deps or ()):
+					if dep.constraint is None:
+						dep_table.extend((intern(dep.name), NONE, NONE))
+					else:
+						# Store the version as written, it is parsed again when loading.
+						version = value[len(dep.name):].lstrip('=<>')
+						dep_table.extend((intern(dep.name), dep.constraint.value, intern(version)))
+
+		provide_table = array.array('I')
+		for provided, index in sorted(set(provides)):
+			provide_table.extend((intern(provided.decode()), index))
+
+		blobs          = [string.encode() for string in string_ids]
+		string_offsets = array.array('I', [0])
+		for blob in blobs:
+			string_offsets.append(string_offsets[-1] + len(blob))
+
+		tables  = [package_table, field_table, value_table, dep_table, provide_table, string_offsets]
+		offsets = []
+		offset  = HEADER.size
+		for table in tables:
+			offsets.append(offset)
+			offset += len(table) * table.itemsize
+		offsets.append(offset)
+
+		fd, temporary = tempfile.mkstemp(dir=os.path.dirname(filename) or '.', suffix='.tmp')
+		with open(fd, 'wb') as file:
+			file.write(HEADER.pack(MAGIC, FORMAT, len(packages), source_size, source_mtime, *offsets))
+			for table in tables:
+				table.tofile(file)
+			file.write(b''.join(blobs))
+		os.chmod(temporary, 0o644)
+		os.replace(temporary, filename)
+
+class MappedRepository(collections.abc.Mapping):
+	"""
+	A read-only dictionary of packages backed by a memory mapped binary snapshot.
+
+	Packages are only decoded when they are looked up, and are kept afterwards.
+	Lookups by name do a binary search over the sorted package table,
+	so they only touch the pages of the snapshot they need.
+	The same goes for provider_names(), which searches the sorted provides table without decoding packages.
+	The parsed dependencies stored in the snapshot are used to fill the dependency caches of the packages.
+	"""
+	def __init__(self, filename):
+		with open(filename, 'rb') as file:
+			self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+		if len(self.mmap) < HEADER.size:
+			self.close()
+			raise RuntimeError(f"Snapshot is truncated: {filename}")
+		magic, format, count, source_size, source_mtime, *offsets = HEADER.unpack_from(self.mmap)
+		if magic != MAGIC or format != FORMAT:
+			self.close()
+			raise RuntimeError(f"Snapshot has an unsupported format: {filename}")
+
+		self.filename     = filename
+		self.count        = count
+		self.source_size  = source_size
+		self.source_mtime = source_mtime
+		self.view         = memoryview(self.mmap)
+		self.package_table, self.field_table, self.value_table, self.dep_table, self.provide_table, self.string_offsets = (
+			self.view[begin:end].cast('I') for begin, end in zip(offsets, offsets[1:])
+		)
+		self.string_data = self.view[offsets[-1]:]
+		self.strings     = {}
+		self.cache       = {}
+
+	def close(self):
+		"""
+		Release the memory map.
+		Packages that were already looked up remain valid.
+		"""
+		for name in ('package_table', 'field_table', 'value_table', 'dep_table', 'provide_table', 'string_offsets', 'string_data', 'view'):
+			view = self.__dict__.pop(name, None)
+			if view is not None: view.release()
+		self.mmap.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def is_current(self, stat):
+		"""
+		Check if the snapshot was made from a database file with the given os.stat() result.
+		"""
+		return self.source_size == stat.st_size and self.source_mtime == stat.st_mtime_ns
+
+	def _string_bytes(self, index):
+		return self.string_data[self.string_offsets[index]:self.string_offsets[index + 1]].tobytes()
+
+	def _string(self, index):
+		if index == NONE: return None
+		try:
+			return self.strings[index]
+		except KeyError:
+			result = sys.intern(self._string_bytes(index).decode())
+			self.strings[index] = result
+			return result
+
+	def _find(self, name):
+		key   = name.encode()
+		lower = 0
+		upper = self.count
+		while lower < upper:
+			middle = (lower + upper) // 2
+			found  = self._string_bytes(self.package_table[middle * PACKAGE_WIDTH])
+			if found < key:
+				lower = middle + 1
+			elif found > key:
+				upper = middle
+			else:
+				return middle
+		return None
+
+	def provider_names(self, name):
+		"""
+		Get the set of names of the packages providing a name, including a package with that name itself.
+		Only the names are read from the snapshot, the packages are not decoded.
+		"""
+		key   = name.encode()
+		count = len(self.provide_table) // PROVIDE_WIDTH
+		lower = 0
+		upper = count
+		while lower < upper:
+			middle = (lower + upper) // 2
+			if self._string_bytes(self.provide_table[middle * PROVIDE_WIDTH]) < key:
+				lower = middle + 1
+			else:
+				upper = middle
+
+		result = set()
+		while lower < count and self._string_bytes(self.provide_table[lower * PROVIDE_WIDTH]) == key:
+			result.add(self._string(self.package_table[self.provide_table[lower * PROVIDE_WIDTH + 1] * PACKAGE_WIDTH]))
+			lower += 1
+		if name in self: result.add(name)
+		return result
+
+	def _dependency(self, index):
+		name, constraint, version = self.dep_table[index * DEP_WIDTH:(index + 1) * DEP_WIDTH]
+		if constraint == NONE: return Dependency(self._string(name))
+		return Dependency(self._string(name), Constraint(constraint), Version.parse(self._string(version)))
+
+	def _package(self, index):
+		name, first_field, field_count = self.package_table[index * PACKAGE_WIDTH:(index + 1) * PACKAGE_WIDTH]
+		package = Package(self._string(name))
+		parsed  = {}
+		for field in range(first_field, first_field + field_count):
+			key, first_value, value_count, first_dep = self.field_table[field * FIELD_WIDTH:(field + 1) * FIELD_WIDTH]
+			key = self._string(key)
+			package.add_values(key, [self._string(value) for value in self.value_table[first_value:first_value + value_count]])
+			if first_dep != NONE:
+				parsed[key] = tuple(self._dependency(dep) for dep in range(first_dep, first_dep + value_count))
+
+		# Adding values clears the parsed fields, so fill them in afterwards.
+		if 'provides' in parsed:
+			parsed['provides'] = frozenset(parsed['provides'] + (Dependency.parse(package.name),))
+		package._parsed.update(parsed)
+		if stats.enabled: stats.count('mapped.packages_decoded')
+		return package
+
+	def __getitem__(self, name):
+		try:
+			return self.cache[name]
+		except KeyError:
+			pass
+		index = self._find(name)
+		if index is None: raise KeyError(name)
+		package = self._package(index)
+		self.cache[name] = package
+		return package
+
+	def __contains__(self, name):
+		return name in self.cache or self._find(name) is not None
+
+	def __iter__(self):
+		for index in range(self.count):
+			yield self._string(self.package_table[index * PACKAGE_WIDTH])
+
+	def __len__(self):
+		return self.count
+
+	def __repr__(self):
+		return '{{MappedRepository: {}, packages: {}}}'.format(self.filename, self.count)
+
+def load_mapped_repository(db_filename, snapshot_filename = None):
+	"""
+	Load a repository database through its binary snapshot.
+	The snapshot is regenerated from the database first if it is missing or stale.
+	"""
+	if snapshot_filename is None: snapshot_filename = default_path(db_filename)
+	stat = os.stat(db_filename)
+	with stats.span('mapped.load'):
+		try:
+			repository = MappedRepository(snapshot_filename)
+			if repository.is_current(stat):
+				stats.count('mapped.snapshot_hits')
+				return repository
+			repository.close()
+		except (FileNotFoundError, RuntimeError, ValueError):
+			pass
+
+		stats.count('mapped.snapshot_misses')
+		packages = alpm.read_package_db_file(db_filename)
+		save_mapped_repository(snapshot_filename, packages, stat.st_size, stat.st_mtime_ns)
+		return MappedRepository(snapshot_filename)
@@ -24,12 +24,25 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import concurrent.futures
+import contextlib
+import os
 import os.path
 
 from . import alpm
+from . import stats
+from . import snapshot
+from .cache import file_stat, unchanged
+from .mapped import MappedRepository
+from .package import ProvidesIndex, dependency_graph
+from .universe import Universe
 
-def provides_dep(package, other_package):
+def provides_dep(package, other_package, index = None):
 	""" Check if a package provides a dependency of another package. """
+	if index is not None:
+		for dep in other_package.alldepends():
+			if index.provides(package, dep.name): return True
+		return False
 	for dep in other_package.alldepends():
 		if package.providesName(dep.name): return True
 	return False
@@ -40,12 +53,19 @@ def package_path(repository_dir, package):
 		raise RuntimeError(f"package has no known filename: {package.name}")
 	return os.path.join(repository_dir, package.get_value('filename'))
 
-def find_newer_deps(package, repository_dir, universe, ignore, quick):
-	built_package = alpm.read_package_file(package_path(repository_dir, package))
+def read_built_package(package, repository_dir):
+	""" Read the metadata of the built archive of a package in a repository. """
+	return alpm.read_package_file(package_path(repository_dir, package))
+
+def newer_deps(package, built_package, universe, ignore, quick, index = None):
+	"""
+	Find dependencies that are newer in the universe than they were when a package was built.
+	An optional ProvidesIndex of the universe speeds up checking if a dependency is still provided.
+	"""
 	for installed in built_package.installed():
 		if installed.name in ignore: continue
 		try:
-			if not provides_dep(universe[installed.name], package): continue
+			if not provides_dep(universe[installed.name], package, index): continue
 		except KeyError:
 			# Previously installed dependency doesn't exist anymore, probably safe to ignore.
 			continue
@@ -55,7 +75,129 @@ def find_newer_deps(package, repository_dir, universe, ignore, quick):
 			yield installed.name, installed.version(), new_version
 			if quick: return
 
-def find_outdated(repository, repository_dir, universe, ignore, quick):
+def find_newer_deps(package, repository_dir, universe, ignore, quick):
+	built_package = read_built_package(package, repository_dir)
+	yield from newer_deps(package, built_package, universe, ignore, quick)
+
+def indexed_built_package(package, installed):
+	"""
+	Get the entry of a package in an installed database (see repoadd.installed_db_filename()),
+	or None if there is none or if it was made for a different archive.
+	"""
+	indexed = installed.get(package.name)
+	if indexed is None or indexed.version() != package.version(): return None
+	sha256sum = package.get_value('sha256sum')
+	if sha256sum is not None and indexed.get_value('sha256sum') != sha256sum: return None
+	return indexed
+
+def read_built_packages(repository, repository_dir, jobs = 1, cache = None, installed = None):
+	"""
+	Read the built archives of all packages in a repository.
+	If jobs is not 1, the archives are read by a pool of worker processes.
+	If a cache is given, only archives without a valid cache entry are read.
+	If the packages of an installed database are given, archives are only read for packages without a matching entry.
+	The results are yielded in repository order as soon as they are available.
+	"""
+	packages = list(repository.values())
+	cached   = [None] * len(packages)
+	if installed is not None:
+		cached = [indexed_built_package(package, installed) for package in packages]
+		if stats.enabled: stats.count('outdated.installed_db_hits', sum(built_package is not None for built_package in cached))
+	paths    = [package_path(repository_dir, package) if built_package is None else None for package, built_package in zip(packages, cached)]
+	if cache is not None:
+		cached = [built_package if built_package is not None else cache.get(path, package.get_value('sha256sum')) for path, package, built_package in zip(paths, packages, cached)]
+	missing  = [path for path, built_package in zip(paths, cached) if built_package is None]
+	# Archives are stat'ed before they are read, so archives replaced while they are read are not cached.
+	before   = {path: file_stat(path) for path in missing} if cache is not None else {}
+
+	with contextlib.ExitStack() as stack:
+		if jobs == 1:
+			read = map(alpm.read_package_file, missing)
+		else:
+			jobs      = jobs or os.cpu_count() or 1
+			chunksize = max(1, len(missing) // (4 * jobs))
+			executor  = stack.enter_context(concurrent.futures.ProcessPoolExecutor(jobs))
+			read      = executor.map(alpm.read_package_file, missing, chunksize=chunksize)
+
+		for package, path, built_package in zip(packages, paths, cached):
+			if built_package is None:
+				built_package = next(read)
+				if cache is not None and unchanged(path, before[path]): cache.put(path, built_package, package.get_value('sha256sum'), before[path])
+			yield built_package
+
+def find_outdated(repository, repository_dir, universe, ignore, quick, jobs = 1, cache = None, installed = None):
+	"""
+	Find packages in a repository that were built against older versions of their dependencies.
+	If jobs is not 1, the package archives are read by that many worker processes.
+	A value of None uses one worker per CPU.
+	If a PackageCache is given, it is used to avoid re-reading unchanged archives.
+	If the packages of the installed database of the repository are given,
+	the package archives are only read for packages that are missing from it.
+	The universe may be a dictionary of packages or a Universe, in which case its shared index is used.
+	For a MappedRepository or a Universe with one, providers are looked up without decoding all packages.
+	"""
+	if isinstance(universe, MappedRepository):
+		universe = Universe([(universe.filename, universe)])
+	if isinstance(universe, Universe):
+		index = universe.provides_index()
+	else:
+		index = ProvidesIndex(universe.values())
+	built_packages = read_built_packages(repository, repository_dir, jobs, cache, installed)
+	for (name, package), built_package in zip(repository.items(), built_packages):
+		stats.count('outdated.packages_checked')
+		newer = list(newer_deps(package, built_package, universe, ignore, quick, index))
+		if newer: yield name, newer
+
+def find_outdated_incremental(repository, repository_dir, universe, ignore, quick, baseline, baseline_outdated, jobs = 1, cache = None, installed = None):
+	"""
+	Find outdated packages, re-checking only packages affected by changes since a baseline.
+
+	The baseline is a dictionary of packages of the universe at the time of a previous run,
+	and baseline_outdated holds the results of find_outdated() for that run.
+	A package is re-checked if it changed itself, or if the name of one of its dependencies
+	is the name of, or is provided by, a package that changed in the universe.
+	The other packages keep their result from the baseline.
+	The ignore and quick arguments should be the same as for the baseline run.
+	If baseline_outdated is None, all packages are checked.
+	"""
+	if baseline_outdated is None:
+		yield from find_outdated(repository, repository_dir, universe, ignore, quick, jobs, cache, installed)
+		return
+
+	diff     = snapshot.diff_repositories(baseline, universe)
+	affected = snapshot.affected_names(baseline, universe, diff)
+	recheck  = {}
 	for name, package in repository.items():
-		newer_deps = list(find_newer_deps(package, repository_dir, universe, ignore, quick))
-		if newer_deps: yield name, newer_deps
+		if name in affected or any(dep.name in affected for dep in package.alldepends()):
+			recheck[name] = package
+
+	rechecked = dict(find_outdated(recheck, repository_dir, universe, ignore, quick, jobs, cache, installed))
+	for name in repository:
+		if name in recheck:
+			if name in rechecked: yield name, rechecked[name]
+		elif name in baseline_outdated:
+			yield name, baseline_outdated[name]
+
+# Up to this many outdated packages, add_rebuilds() searches reverse dependencies per package
+# instead of computing the reachability table of the whole repository.
+ON_DEMAND_SEED_LIMIT = 64
+
+def add_rebuilds(outdated, repository, universe, ignore, reachability = None):
+	"""
+	Add the reverse dependencies in a repository of outdated packages to a dictionary of outdated packages.
+	The reverse dependencies are listed with a (name, version, "rebuild") entry for each outdated dependency.
+	If no reachability table of reverse dependencies of the repository is given,
+	the reverse dependencies are searched for each outdated package separately when there are only a few,
+	and the transitive closure of the reverse dependency graph is computed otherwise.
+	"""
+	seeds = [pkg for pkg in outdated if pkg not in ignore]
+	if reachability is None:
+		graph = dependency_graph(repository.values())
+		if len(seeds) <= ON_DEMAND_SEED_LIMIT:
+			reachability = {pkg: graph.search_dependents([pkg]) for pkg in seeds}
+		else:
+			reachability = graph.reversed().reachability_table(seeds)
+	for pkg in seeds:
+		for dep in reachability[pkg]:
+			if not dep in outdated: outdated[dep] = []
+			outdated[dep].append((pkg, universe[pkg].version(), "rebuild"))
@@ -26,7 +26,10 @@
 
 from enum import Enum, unique
 import operator
+import sys
 
+from . import graph
+from . import stats
 from . import util
 from .version import Version
 
@@ -74,8 +77,18 @@ class Dependency:
 		self.constraint = constraint
 
 	def satisfiedBy(self, package):
-		if self.constraint is None: return self.name == package.name
-		return self.name == package.name and self.constraint.toFunctor(package.version(), self.version)
+		"""
+		Check if a package satisfies the dependency, by name or by one of its provides.
+		A versioned dependency can only be satisfied by a provide with an exact version.
+		"""
+		compare = self.constraint.functor() if self.constraint is not None else None
+		if self.name == package.name:
+			if compare is None or compare(package.version(), self.version): return True
+		for provide in package.provides():
+			if provide.name != self.name: continue
+			if compare is None: return True
+			if provide.constraint is Constraint.eq and compare(provide.version, self.version): return True
+		return False
 
 	@classmethod
 	def parse(cls, blob):
@@ -104,25 +117,42 @@ class Package:
 	"""
 	Holds package metadata.
 	node.name holds the name of the node.
-	node.children holds the data as a dictionary with each key having a list of values.
+	node.data holds the data as a dictionary with each key having a list of values.
+
+	Typed fields such as the version and dependencies are parsed on first access and cached.
+	The cache is cleared whenever a value is added.
 	"""
+	__slots__ = ('name', 'data', '_parsed')
+
 	def __init__(self, name):
-		self.name = name
-		self.data = {
-			'pkgname': [name],
+		self.name    = sys.intern(name)
+		self.data    = {
+			'pkgname': [self.name],
 		}
+		self._parsed = {}
+
+	def __getstate__(self):
+		return self.name, self.data
+
+	def __setstate__(self, state):
+		self.name, self.data = state
+		self._parsed = {}
 
 	def __make_key(self, key):
 		if not key in self.data:
-			self.data[key] = []
+			self.data[sys.intern(key)] = []
 
 	def add_value(self, key, value):
 		self.__make_key(key)
+		if key == 'arch' and value is not None: value = sys.intern(value)
 		self.data[key].append(value);
+		self._parsed.clear()
 
 	def add_values(self, key, values):
 		self.__make_key(key)
+		if key == 'arch': values = [sys.intern(x) if x is not None else x for x in values]
 		self.data[key] += values;
+		self._parsed.clear()
 
 	def get_value(self, key):
 		if not key in self.data: return None
@@ -132,45 +162,57 @@ class Package:
 		if not key in self.data: return []
 		return self.data[key]
 
+	def __parsed(self, key, parse):
+		try:
+			return self._parsed[key]
+		except KeyError:
+			pass
+		result = parse()
+		self._parsed[key] = result
+		return result
+
+	def __parsed_dependencies(self, key):
+		return self.__parsed(key, lambda: tuple(map(Dependency.parse, self.get_values(key))))
+
 	def version(self):
-		return Version(self.get_value('pkgver'), self.get_value('pkgrel'), self.get_value('epoch'))
+		return self.__parsed('version', lambda: Version(self.get_value('pkgver'), self.get_value('pkgrel'), self.get_value('epoch')))
 
 	def depends(self):
-		return map(Dependency.parse, self.get_values('depends'))
+		return self.__parsed_dependencies('depends')
 
 	def optdepends(self):
-		return map(Dependency.parse, self.get_values('optdepends'))
+		return self.__parsed_dependencies('optdepends')
 
 	def makedepends(self):
-		return map(Dependency.parse, self.get_values('makedepends'))
+		return self.__parsed_dependencies('makedepends')
 
 	def checkdepends(self):
-		return map(Dependency.parse, self.get_values('checkdepends'))
+		return self.__parsed_dependencies('checkdepends')
 
 	def alldepends(self):
-		yield from self.depends()
-		yield from self.makedepends()
-		yield from self.checkdepends()
-		#yield from self.optdepends()
+		return self.__parsed('alldepends', lambda: self.depends() + self.makedepends() + self.checkdepends())
 
 	def installed(self):
-		return map(package_from_name_guess, self.get_values('installed'))
+		return self.__parsed('installed', lambda: tuple(map(package_from_name_guess, self.get_values('installed'))))
 
 	def provides(self):
-		result = set(map(Dependency.parse, self.get_values('provides')))
-		result.add(Dependency.parse(self.name))
-		return result
+		def parse():
+			result = set(map(Dependency.parse, self.get_values('provides')))
+			result.add(Dependency.parse(self.name))
+			return frozenset(result)
+		return self.__parsed('provides', parse)
+
+	def providedNames(self):
+		return self.__parsed('provided_names', lambda: frozenset(x.name for x in self.provides()))
 
 	def providesName(self, name):
-		for provide in self.provides():
-			if provide.name == name: return True
-		return False
+		return name in self.providedNames()
 
 	def conflicts(self):
-		return map(Dependency.parse, self.get_values('conflicts'))
+		return self.__parsed_dependencies('conflicts')
 
 	def replaces(self):
-		return map(Dependency.parse, self.get_values('replaces'))
+		return self.__parsed_dependencies('replaces')
 
 	def hasOption(self, option):
 		return option in self.get_values('options')
@@ -211,6 +253,85 @@ class Package:
 
 		return package
 
+class ProvidesIndex:
+	"""
+	An index of the packages providing each (real or virtual) package name.
+	index.providers holds a list of (package, version) tuples for each provided name.
+	The version is None for provides without a version.
+	"""
+	def __init__(self, packages = ()):
+		self.providers = {}
+		self.names     = {}
+		with stats.span('package.provides_index'):
+			for package in packages:
+				self.add(package)
+
+	@staticmethod
+	def provide_version(package, provide):
+		"""
+		Get the version a package provides a name with, or None if the provide has no exact version.
+		"""
+		if provide.name == package.name and provide.constraint is None:
+			return package.version()
+		elif provide.constraint is not Constraint.eq:
+			return None
+		return provide.version
+
+	def add(self, package):
+		for provide in package.provides():
+			self.providers.setdefault(provide.name, []).append((package, self.provide_version(package, provide)))
+			self.names.setdefault(provide.name, set()).add(package.name)
+
+	def provider_names(self, name):
+		"""
+		Get the set of names of the packages providing a name.
+		"""
+		return self.names.get(name, frozenset())
+
+	def provider_entries(self, name):
+		"""
+		Get the list of (package, version) tuples of the packages providing a name, see ProvidesIndex.providers.
+		"""
+		return self.providers.get(name, [])
+
+	def provides(self, package, name):
+		"""
+		Check if a package provides a name.
+		"""
+		return package.name in self.provider_names(name)
+
+	def satisfied(self, dependency):
+		"""
+		Check if any package satisfies a dependency, taking version constraints into account.
+		"""
+		providers = self.provider_entries(dependency.name)
+		if not providers: return False
+		if dependency.constraint is None: return True
+		compare = dependency.constraint.functor()
+		for package, version in providers:
+			if version is not None and compare(version, dependency.version): return True
+		return False
+
+	def satisfiers(self, dependency):
+		"""
+		Get the list of packages that satisfy a dependency, taking version constraints into account.
+		"""
+		providers = self.provider_entries(dependency.name)
+		if dependency.constraint is None:
+			return [package for package, version in providers]
+		compare = dependency.constraint.functor()
+		return [package for package, version in providers if version is not None and compare(version, dependency.version)]
+
+def package_from_data(data):
+	"""
+	Create a package from a data dictionary as stored in package.data.
+	"""
+	package = Package(data['pkgname'][0])
+	for key, values in data.items():
+		if key == 'pkgname': continue
+		package.add_values(key, values)
+	return package
+
 def split_pkgname(name):
 	"""
 		Split a package name in four fields:
@@ -260,50 +381,95 @@ def package_from_name_guess(name):
 		return package_from_name_arch(name)
 	return package_from_name(name)
 
+def dependency_graph(packages, index = None):
+	"""
+	Build the DependencyGraph of a set of packages.
+
+	There is a node for each package and for each name that is depended on.
+	A package has an edge to the name of each of its dependencies and to all packages providing that name,
+	except to itself: a package that provides a name it depends on does not depend on itself.
+	If no ProvidesIndex is given, one is built from the packages.
+	"""
+	with stats.span('package.dependency_graph'):
+		packages = list(packages)
+		if index is None: index = ProvidesIndex(packages)
+		names = [package.name for package in packages]
+		ids   = {name: id for id, name in enumerate(names)}
+
+		def intern(name):
+			id = ids.get(name)
+			if id is None:
+				id = len(names)
+				ids[name] = id
+				names.append(name)
+			return id
+
+		def row(package):
+			result = set()
+			for dependency in package.alldepends():
+				result.add(intern(dependency.name))
+				result.update(map(intern, index.provider_names(dependency.name)))
+			result.discard(ids[package.name])
+			return result
+
+		return graph.DependencyGraph.from_rows(names, map(row, packages))
+
 def neighbour_table(packages):
 	"""
 	Build a neighbour table for dependencies.
+	Packages are listed with the names of their dependencies and the names of all packages providing them.
 	"""
-	table = {}
-	for package in packages:
-		table[package.name] = [x.name for x in package.alldepends()]
-		for name in map(lambda x: x.name, package.provides()):
-			table[package.name] = list(table[package.name])
-	return table
-
-def reverse_neighbour_table(packages):
+	packages = list(packages)
+	result   = dependency_graph(packages)
+	return {package.name: result.dependencies(package.name) for package in packages}
+
+def reverse_neighbour_table(packages, index = None):
 	"""
 	Build a neighbour table for reverse dependencies.
+	Dependents are listed under the name of the dependency and under the names of all its providers.
+	If no ProvidesIndex is given, one is built from the packages.
+	The DependencyGraph from dependency_graph() holds the same information in less memory.
 	"""
-	table = {}
-	for package in packages:
-		if not package.name in table: table[package.name] = set()
-		for dependency in package.alldepends():
-			if not dependency.name in table: table[dependency.name] = set()
-			for provides in [package.name] + [x.name for x in package.provides()]:
-				table[dependency.name].add(package.name)
-	return table
-
-def reachability_table(neighbours):
-	"""
-	Build a reachability table from a neighbour table.
+	with stats.span('package.reverse_neighbour_table'):
+		return dependency_graph(packages, index).reversed().table()
+
+reachability_table = graph.reachability_table
+
+def search_reverse_dependencies(reverse_neighbours, seeds, recursive = True, depth = None, ignore = ()):
 	"""
-	reachable = neighbours.copy()
-	for a in reachable:
-		for b in reachable:
-			if a in reachable[b]: reachable[b].update(reachable[a])
-	return reachable
+	Find the reverse dependencies of a set of seed packages in a reverse neighbour table or a DependencyGraph.
+	Only the part of the graph reachable from the seeds is visited.
 
+	If recursive is false, only direct reverse dependencies are given.
+	If depth is given, the search stops after that many levels.
+	Packages in ignore are not reported and not searched through.
+	A seed is only part of the result if it is a reverse dependency of a seed itself.
+	"""
+	if not recursive: depth = 1
+	if isinstance(reverse_neighbours, graph.DependencyGraph):
+		return reverse_neighbours.search_dependents(seeds, depth, ignore)
+	result   = set()
+	visited  = set(seeds)
+	frontier = list(visited)
+	level    = 0
+	while frontier and (depth is None or level < depth):
+		next_frontier = []
+		for name in frontier:
+			for dependent in reverse_neighbours.get(name, ()):
+				if dependent in ignore: continue
+				result.add(dependent)
+				if dependent not in visited:
+					visited.add(dependent)
+					next_frontier.append(dependent)
+		frontier = next_frontier
+		level   += 1
+	return result
 
-def reverse_dependencies(database, packages, recursive = True):
+def reverse_dependencies(database, packages, recursive = True, depth = None, ignore = ()):
 	"""
 	Get a set of reverse dependencies for a list of packages.
 	If recursive is true indirect reverse dependencies are also given.
+	See search_reverse_dependencies() for the depth and ignore arguments.
 	"""
-	reverse_dependencies = build_reverse_neighbour_table(database)
-	if recursive: reverse_dependencies = reachability_table(reverse_dependencies)
-
-	result = set()
-	for package in packages:
-		result.update(reverse_dependencies[package])
-	return result
+	with stats.span('package.reverse_dependencies'):
+		return search_reverse_dependencies(dependency_graph(database.values()), packages, recursive, depth, ignore)
@@ -0,0 +1,318 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import base64
+import concurrent.futures
+import contextlib
+import logging
+import os
+
+from . import alpm
+from . import stats
+from .package import split_pkgname
+from .verify import hash_file_digests
+
+# The sections of a desc entry in the order written by repo-add,
+# with the .PKGINFO key they are taken from (or None if they are computed).
+DESC_SECTIONS = (
+	('FILENAME',     None),
+	('NAME',         'pkgname'),
+	('BASE',         'pkgbase'),
+	('VERSION',      'pkgver'),
+	('DESC',         'pkgdesc'),
+	('GROUPS',       'group'),
+	('CSIZE',        None),
+	('ISIZE',        'size'),
+	('MD5SUM',       None),
+	('SHA256SUM',    None),
+	('PGPSIG',       None),
+	('URL',          'url'),
+	('LICENSE',      'license'),
+	('ARCH',         'arch'),
+	('BUILDDATE',    'builddate'),
+	('PACKAGER',     'packager'),
+	('REPLACES',     'replaces'),
+	('CONFLICTS',    'conflict'),
+	('PROVIDES',     'provides'),
+	('DEPENDS',      'depend'),
+	('OPTDEPENDS',   'optdepend'),
+	('MAKEDEPENDS',  'makedepend'),
+	('CHECKDEPENDS', 'checkdepend'),
+)
+
+# The names of the entries of a package in the different databases.
+ENTRY_NAMES = ('desc', 'files', 'installed')
+
+# The libarchive filters for the known database suffixes.
+DB_FILTERS = (
+	('.tar.gz',  'gzip'),
+	('.tar.bz2', 'bzip2'),
+	('.tar.xz',  'xz'),
+	('.tar.zst', 'zstd'),
+	('.tar.lz4', 'lz4'),
+	('.tar.Z',   'compress'),
+	('.tar',     None),
+)
+
+def format_alpm_bytes(sections):
+	"""
+	Format a list of (key, values) tuples as ALPM file.
+	Sections without values are left out.
+	"""
+	return ''.join('%{}%\n{}\n\n'.format(key, '\n'.join(values)) for key, values in sections if values).encode()
+
+def db_filter(filename):
+	"""
+	Get the libarchive filter to use for a database file based on its name.
+	Names without a known suffix (like repo.db) are compressed with gzip, just like repo-add does.
+	"""
+	for suffix, filter in DB_FILTERS:
+		if filename.endswith(suffix): return filter
+	return 'gzip'
+
+def _sidecar_filename(db_filename, kind):
+	directory, name = os.path.split(db_filename)
+	head, sep, tail = name.rpartition('.db')
+	if not sep: raise RuntimeError(f"repository database name does not contain `.db': {db_filename}")
+	return os.path.join(directory, head + '.' + kind + tail)
+
+def files_db_filename(db_filename):
+	"""
+	Get the name of the files database that belongs with a repository database.
+	"""
+	return _sidecar_filename(db_filename, 'files')
+
+def installed_db_filename(db_filename):
+	"""
+	Get the name of the installed database that belongs with a repository database.
+
+	The installed database holds an installed entry for each package with the sha256sum of the archive
+	and the installed packages from its .BUILDINFO, so they can be checked without the package archives.
+	"""
+	return _sidecar_filename(db_filename, 'installed')
+
+class PackageEntry:
+	"""
+	The database entries for a single package.
+	entry.desc, entry.files and entry.installed hold the contents of the desc, files and installed files (or None).
+	"""
+	def __init__(self, name, directory, desc, files = None, installed = None):
+		self.name      = name
+		self.directory = directory
+		self.desc      = desc
+		self.files     = files
+		self.installed = installed
+
+	def __repr__(self):
+		return '{{PackageEntry: {}}}'.format(self.directory)
+
+def read_package_entry(filename, files = True, installed = False):
+	"""
+	Create the database entries for a package archive.
+	The metadata is read from the .PKGINFO of the archive and the checksums are computed from the archive itself.
+	If files is true, the file list for the files database is collected as well.
+	If installed is true, the installed packages are read from the .BUILDINFO for the installed database.
+	Archives without a .BUILDINFO get no installed entry (entry.installed is None).
+	"""
+	import libarchive
+	data      = None
+	buildinfo = None
+	file_list = []
+	buffer    = bytearray()
+	with stats.span('repoadd.read_package_entry'), libarchive.file_reader(filename) as archive:
+		for entry in archive:
+			path = entry.pathname
+			if path == '.PKGINFO':
+				data = alpm.parse_info_bytes(alpm.read_entry(entry, buffer))
+			elif path == '.BUILDINFO' and installed:
+				buildinfo = alpm.parse_info_bytes(alpm.read_entry(entry, buffer))
+			elif files and not path.startswith('.'):
+				file_list.append(path + '/' if entry.isdir and not path.endswith('/') else path)
+			if not files and data is not None and (buildinfo is not None or not installed): break
+	if data is None: raise RuntimeError(f"Found no .PKGINFO in archive: {filename}")
+
+	md5sum, sha256sum = hash_file_digests(filename, ('md5', 'sha256'))
+	computed = {
+		'FILENAME':  [os.path.basename(filename)],
+		'CSIZE':     [str(os.path.getsize(filename))],
+		'MD5SUM':    [md5sum],
+		'SHA256SUM': [sha256sum],
+	}
+	if os.path.exists(filename + '.sig'):
+		with open(filename + '.sig', 'rb') as file:
+			computed['PGPSIG'] = [base64.b64encode(file.read()).decode()]
+
+	sections = [(key, computed.get(key) if source is None else data.get(source)) for key, source in DESC_SECTIONS]
+	name     = data['pkgname'][0]
+	desc     = format_alpm_bytes(sections)
+	if files:
+		# repo-add writes the section header even for packages without files.
+		file_list.sort()
+		files = ''.join(['%FILES%\n'] + [path + '\n' for path in file_list]).encode()
+	else:
+		files = None
+	if installed and buildinfo is None:
+		# Packages built before pacman 5.0 have no .BUILDINFO.
+		# An empty entry would claim nothing was installed, so they are left out and lookups fall back to the archive.
+		logging.warning("Package archive `{}' has no .BUILDINFO, it is left out of the installed database.".format(filename))
+		installed = None
+	elif installed:
+		installed = format_alpm_bytes([('SHA256SUM', [sha256sum]), ('INSTALLED', buildinfo.get('installed'))])
+	else:
+		installed = None
+	return PackageEntry(name, '{}-{}'.format(name, data['pkgver'][0]), desc, files, installed)
+
+def read_db_entries(filename):
+	"""
+	Read the raw entries of an existing repository, files or installed database.
+	Returns a dictionary of PackageEntry objects indexed by package name.
+	"""
+	import libarchive
+	result = {}
+	buffer = bytearray()
+	with stats.span('repoadd.read_db_entries'), libarchive.file_reader(filename) as archive:
+		for entry in archive:
+			if entry.isdir: continue
+			directory, basename = os.path.split(entry.pathname)
+			if basename not in ENTRY_NAMES: continue
+			name        = split_pkgname(directory)[0]
+			package     = result.get(name)
+			if package is None or package.directory != directory:
+				package      = PackageEntry(name, directory, None)
+				result[name] = package
+			setattr(package, basename, bytes(alpm.read_entry(entry, buffer)))
+	return result
+
+def write_db_entries(filename, entries, names = ('desc',)):
+	"""
+	Write a repository database with the given package entries.
+	Only the named entries of each package are written:
+	('desc',) for a repository database, ('desc', 'files') for a files database and ('installed',) for an installed database.
+	The database is written to a temporary file that replaces the target when it is complete.
+	If the target is a symlink (like repo.db -> repo.db.tar.gz), the file it points to is replaced.
+	"""
+	import libarchive
+	target    = os.path.realpath(filename)
+	temporary = target + '.tmp'
+	try:
+		with stats.span('repoadd.write_db_entries'), libarchive.file_writer(temporary, 'pax_restricted', db_filter(target)) as archive:
+			for entry in sorted(entries, key=lambda entry: entry.directory):
+				for name in names:
+					data = getattr(entry, name)
+					if data is not None:
+						archive.add_file_from_memory(entry.directory + '/' + name, len(data), data, permission=0o644)
+		os.replace(temporary, target)
+	except BaseException:
+		with contextlib.suppress(FileNotFoundError): os.unlink(temporary)
+		raise
+
+@contextlib.contextmanager
+def lock_db(db_filename):
+	"""
+	Hold the repo-add lock file of a repository database.
+	"""
+	lock = db_filename + '.lck'
+	try:
+		fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+	except FileExistsError:
+		raise RuntimeError(f"repository database is locked, remove {lock} if no other process is using it")
+	try:
+		os.close(fd)
+		yield
+	finally:
+		os.unlink(lock)
+
+def read_package_entries(archives, files = True, jobs = 1, installed = False):
+	"""
+	Create the database entries for a list of package archives.
+	If jobs is not 1, the archives are read by a pool of worker processes (0 or None to use all CPUs).
+	"""
+	if jobs == 1:
+		return [read_package_entry(archive, files, installed) for archive in archives]
+	jobs      = jobs or os.cpu_count() or 1
+	chunksize = max(1, len(archives) // (4 * jobs))
+	with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+		return list(executor.map(read_package_entry, archives, [files] * len(archives), [installed] * len(archives), chunksize=chunksize))
+
+def update_repository(db_filename, add = (), remove = (), jobs = 1, files_filename = None, installed_filename = None):
+	"""
+	Add package archives to and remove packages by name from a repository database, like repo-add and repo-remove.
+
+	The entries of untouched packages are copied from the existing database without being parsed,
+	so only the added archives are read.
+	An added archive replaces any existing entry for a package with the same name.
+	If files_filename or installed_filename is given, the files or installed database is updated in the same way.
+	The databases are created if they do not exist yet.
+	Returns a tuple (added, removed) with the names of the added and removed packages.
+	"""
+	with lock_db(db_filename):
+		new_entries = read_package_entries(list(add), files_filename is not None, jobs, installed_filename is not None)
+		added       = [entry.name for entry in new_entries]
+		removed     = []
+
+		for filename, names in ((db_filename, ('desc',)), (files_filename, ('desc', 'files')), (installed_filename, ('installed',))):
+			if filename is None: continue
+			entries = read_db_entries(filename) if os.path.exists(filename) else {}
+			for name in remove:
+				if entries.pop(name, None) is not None and filename is db_filename: removed.append(name)
+			for entry in new_entries:
+				entries[entry.name] = entry
+			stats.count('repoadd.entries_written', len(entries))
+			write_db_entries(filename, entries.values(), names)
+
+	return added, removed
+
+def index_installed(db_filename, repository_dir = None, jobs = 1, installed_filename = None):
+	"""
+	Add the packages of a repository that are missing from its installed database, or that changed since they were added.
+	The archives of those packages are read from the repository directory (by default the directory of the database).
+	This creates the installed database for an existing repository.
+	Packages without a .BUILDINFO are left out, see read_package_entry().
+	Returns the names of the added packages.
+	"""
+	if repository_dir is None: repository_dir = os.path.dirname(db_filename)
+	if installed_filename is None: installed_filename = installed_db_filename(db_filename)
+	with lock_db(db_filename):
+		repository = alpm.read_package_db_file(db_filename, ('filename', 'sha256sum'))
+		current    = alpm.read_package_db_file(installed_filename, ('sha256sum',)) if os.path.exists(installed_filename) else {}
+		entries    = read_db_entries(installed_filename) if os.path.exists(installed_filename) else {}
+
+		missing = {}
+		for name, package in repository.items():
+			indexed = current.get(name)
+			if indexed is None or indexed.get_value('sha256sum') != package.get_value('sha256sum'):
+				missing[name] = os.path.join(repository_dir, package.get_value('filename'))
+		new_entries = [entry for entry in read_package_entries(list(missing.values()), False, jobs, True) if entry.installed is not None]
+
+		# Drop the entries of packages that are no longer in the repository or whose archive changed.
+		entries = {name: entry for name, entry in entries.items() if name in repository and name not in missing}
+		for entry in new_entries:
+			entries[entry.name] = entry
+		if new_entries or len(entries) != len(current) or not os.path.exists(installed_filename):
+			stats.count('repoadd.entries_written', len(entries))
+			write_db_entries(installed_filename, entries.values(), ('installed',))
+
+	return [entry.name for entry in new_entries]
@@ -0,0 +1,155 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+from . import stats
+from .package import ProvidesIndex
+from .universe import Universe
+
+# The dependency fields checked by default.
+DEFAULT_FIELDS = ('depends',)
+
+class BrokenDependency:
+	"""
+	A dependency of a package that no package in the universe satisfies.
+	broken.reason is 'missing' if nothing provides the name at all,
+	or 'version' if the name is provided, but not with a matching version.
+	broken.candidates holds (name, version) tuples of the packages providing the name.
+	"""
+	def __init__(self, package, field, dependency, reason, candidates = ()):
+		self.package    = package
+		self.field      = field
+		self.dependency = dependency
+		self.reason     = reason
+		self.candidates = list(candidates)
+
+	def key(self):
+		""" A key identifying the broken dependency, to compare results of different checks. """
+		return (self.package, self.field, str(self.dependency))
+
+	def __str__(self):
+		if self.reason == 'missing':
+			return '{}: {} {} (missing)'.format(self.package, self.field, self.dependency)
+		candidates = ', '.join('{} {}'.format(name, version) if version is not None else name for name, version in self.candidates)
+		return '{}: {} {} (found {})'.format(self.package, self.field, self.dependency, candidates)
+
+	def __repr__(self):
+		return '{{BrokenDependency: {}}}'.format(self)
+
+def _dependency_key(dependency):
+	version = dependency.version.key if dependency.version is not None else None
+	return (dependency.name, dependency.constraint, version)
+
+def _dependencies(package, field):
+	# The dependency fields have an accessor method with the same name, which caches the parsed dependencies.
+	return getattr(package, field)()
+
+def _universe_index(universe):
+	if isinstance(universe, Universe): return universe.provides_index()
+	return ProvidesIndex(universe.values())
+
+def check_dependencies(universe, packages = None, fields = DEFAULT_FIELDS, index = None):
+	"""
+	Find the dependencies that are not satisfied by any package in a universe.
+
+	The universe is a Universe or a dictionary of packages by name.
+	If packages is given, only the dependencies of those packages are checked, otherwise those of the whole universe.
+	The result of each distinct dependency is computed once, so shared dependencies are cheap.
+	Returns a list of BrokenDependency objects.
+	"""
+	if index is None: index = _universe_index(universe)
+	if packages is None: packages = universe.values()
+
+	result    = []
+	satisfied = {}
+	with stats.span('satisfy.check_dependencies'):
+		for package in packages:
+			for field in fields:
+				for dependency in _dependencies(package, field):
+					key = _dependency_key(dependency)
+					ok  = satisfied.get(key)
+					if ok is None:
+						ok = index.satisfied(dependency)
+						satisfied[key] = ok
+					if ok: continue
+					providers = index.provider_entries(dependency.name)
+					if not providers:
+						result.append(BrokenDependency(package.name, field, dependency, 'missing'))
+					else:
+						result.append(BrokenDependency(package.name, field, dependency, 'version', [(provider.name, version) for provider, version in providers]))
+		if stats.enabled: stats.count('satisfy.distinct_dependencies', len(satisfied))
+	return result
+
+class UpgradeResult:
+	"""
+	The effect of upgrading packages on the satisfiability of dependencies.
+	result.broken holds the dependencies that are broken after the upgrade, but were not before,
+	result.fixed holds the dependencies that were broken before the upgrade, but are not anymore.
+	Both are lists of BrokenDependency objects, the fixed ones as they were before the upgrade.
+	"""
+	def __init__(self, broken, fixed):
+		self.broken = broken
+		self.fixed  = fixed
+
+	def __bool__(self):
+		return bool(self.broken)
+
+	def __repr__(self):
+		return '{{UpgradeResult: broken: {}, fixed: {}}}'.format(self.broken, self.fixed)
+
+def simulate_upgrade(universe, upgrades, fields = DEFAULT_FIELDS):
+	"""
+	Check what happens to the satisfiability of dependencies if packages are upgraded (or added).
+
+	The upgrades are a dictionary of packages by name that replace the packages with the same name in the universe.
+	Only the dependencies that can be affected are checked:
+	those of the upgraded packages and those on names that the old or new packages provide.
+	Returns an UpgradeResult.
+	"""
+	if not isinstance(universe, Universe): universe = Universe([('universe', universe)])
+	upgraded = Universe((layer.name, layer.packages) for layer in universe.layers)
+	upgraded.add_layer('upgrades', upgrades)
+
+	with stats.span('satisfy.simulate_upgrade'):
+		# Find the names that may resolve differently after the upgrade.
+		names = set()
+		for name, package in upgrades.items():
+			names |= package.providedNames()
+			if name in universe: names |= universe[name].providedNames()
+
+		def affected(packages):
+			for package in packages.values():
+				if package.name in upgrades or any(dep.name in names for field in fields for dep in _dependencies(package, field)):
+					yield package
+
+		before = check_dependencies(universe, list(affected(universe)), fields)
+		after  = check_dependencies(upgraded, list(affected(upgraded)), fields)
+
+	before_keys = {broken.key() for broken in before}
+	after_keys  = {broken.key() for broken in after}
+	return UpgradeResult(
+		[broken for broken in after  if broken.key() not in before_keys],
+		[broken for broken in before if broken.key() not in after_keys],
+	)
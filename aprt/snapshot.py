@@ -0,0 +1,111 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import json
+
+from .package import package_from_data
+from .version import Version
+
+# The package fields stored in a snapshot.
+SNAPSHOT_FIELDS = ('pkgname', 'pkgver', 'pkgrel', 'epoch', 'builddate', 'sha256sum', 'provides')
+
+class RepositoryDiff:
+	"""
+	The difference between two repository snapshots.
+	diff.added, diff.removed and diff.changed hold sets of package names.
+	"""
+	def __init__(self, added, removed, changed):
+		self.added   = added
+		self.removed = removed
+		self.changed = changed
+
+	def names(self):
+		""" Get the names of all added, removed and changed packages. """
+		return self.added | self.removed | self.changed
+
+	def __bool__(self):
+		return bool(self.added or self.removed or self.changed)
+
+	def __repr__(self):
+		return '{{RepositoryDiff: added: {}, removed: {}, changed: {}}}'.format(sorted(self.added), sorted(self.removed), sorted(self.changed))
+
+def package_changed(old, new):
+	"""
+	Check if a package changed based on version, build date and checksum.
+	"""
+	if old.version().key != new.version().key: return True
+	if old.get_value('builddate') != new.get_value('builddate'): return True
+	if old.get_value('sha256sum') != new.get_value('sha256sum'): return True
+	return False
+
+def diff_repositories(old, new):
+	"""
+	Diff two dictionaries of packages as returned by read_package_db_file().
+	"""
+	added   = new.keys() - old.keys()
+	removed = old.keys() - new.keys()
+	changed = {name for name in old.keys() & new.keys() if package_changed(old[name], new[name])}
+	return RepositoryDiff(added, removed, changed)
+
+def affected_names(old, new, diff):
+	"""
+	Get all names that may resolve differently after a change:
+	the names of the changed packages and everything they provide before and after the change.
+	"""
+	result = set()
+	for name in diff.names():
+		if name in old: result |= old[name].providedNames()
+		if name in new: result |= new[name].providedNames()
+		result.add(name)
+	return result
+
+def save_snapshot(filename, packages, outdated = None):
+	"""
+	Save a snapshot of a dictionary of packages to a file.
+	Only the fields needed to detect changes are stored.
+	Optionally the results of find_outdated() for the snapshot can be stored along with it.
+	"""
+	data = {
+		'packages': {name: {key: package.get_values(key) for key in SNAPSHOT_FIELDS if key in package.data} for name, package in packages.items()},
+		'outdated': None,
+	}
+	if outdated is not None:
+		data['outdated'] = {name: [[dep, str(old), str(new)] for dep, old, new in deps] for name, deps in outdated.items()}
+	with open(filename, 'w') as file:
+		json.dump(data, file)
+
+def load_snapshot(filename):
+	"""
+	Load a snapshot saved with save_snapshot().
+	Returns a tuple (packages, outdated) where outdated is None if it was not saved.
+	"""
+	with open(filename, 'r') as file:
+		data = json.load(file)
+	packages = {name: package_from_data(package) for name, package in data['packages'].items()}
+	outdated = data['outdated']
+	if outdated is not None:
+		outdated = {name: [(dep, Version.parse(old), Version.parse(new)) for dep, old, new in deps] for name, deps in outdated.items()}
+	return packages, outdated
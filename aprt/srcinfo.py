@@ -24,10 +24,14 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import concurrent.futures
+import json
 import os
 import os.path
 
-from .package import Package
+from . import stats
+from .cache import FileCache, file_stat, unchanged
+from .package import Package, package_from_data
 
 class SrcInfo:
 	"""
@@ -104,22 +108,65 @@ class SrcInfo:
 		return cls.parse_file(filename).packages()
 
 	@classmethod
-	def __find_srcinfo_dirs(cls, root):
-		children = os.listdir(root)
+	def find_srcinfo_dirs(cls, root, ignore = ()):
+		"""
+		Find all directories containing a .SRCINFO file.
+		Subdirectories with a name in ignore are not searched.
+		"""
+		with os.scandir(root) as entries:
+			children = list(entries)
 
 		for child in children:
-			path = os.path.join(root, child)
-			if child == '.SRCINFO':
+			if child.name == '.SRCINFO':
 				yield root
-			if os.path.isdir(path):
-				yield from cls.__find_srcinfo_dirs(path)
+				break
+
+		for child in children:
+			if child.name in ignore: continue
+			if child.is_dir():
+				yield from cls.find_srcinfo_dirs(child.path, ignore)
 
 	@classmethod
-	def load_db(cls, root):
-		directories = cls.__find_srcinfo_dirs(root)
-		result      = {}
-		for directory in directories:
-			srcinfo           = cls.parse_file(os.path.join(directory, '.SRCINFO'))
+	def load_db(cls, root, jobs = 1, cache = None, ignore = ()):
+		"""
+		Load all .SRCINFO files in a directory tree.
+		The result is a dictionary of SrcInfo objects indexed by directory.
+
+		If jobs is not 1, the files are parsed by that many worker processes.
+		A value of None uses one worker per CPU.
+		If a SrcInfoCache is given, only files without a valid cache entry are parsed.
+		"""
+		with stats.span('srcinfo.load_db'):
+			return cls.__load_db(root, jobs, cache, ignore)
+
+	@classmethod
+	def __load_db(cls, root, jobs, cache, ignore):
+		with stats.span('srcinfo.find_srcinfo_dirs'):
+			directories = list(cls.find_srcinfo_dirs(root, ignore))
+		filenames   = [os.path.join(directory, '.SRCINFO') for directory in directories]
+		cached      = [None] * len(filenames)
+		if cache is not None:
+			cached = [cache.get(filename) for filename in filenames]
+		missing     = [filename for filename, srcinfo in zip(filenames, cached) if srcinfo is None]
+		# Files are stat'ed before they are parsed, so files edited while they are parsed are not cached.
+		before      = {filename: file_stat(filename) for filename in missing} if cache is not None else {}
+		stats.count('srcinfo.files_parsed', len(missing))
+		stats.count('srcinfo.cache_hits', len(filenames) - len(missing))
+
+		if jobs == 1 or len(missing) < 2:
+			parsed = list(map(cls.parse_file, missing))
+		else:
+			jobs      = jobs or os.cpu_count() or 1
+			chunksize = max(1, len(missing) // (4 * jobs))
+			with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+				parsed = list(executor.map(cls.parse_file, missing, chunksize=chunksize))
+		parsed = iter(parsed)
+
+		result = {}
+		for directory, filename, srcinfo in zip(directories, filenames, cached):
+			if srcinfo is None:
+				srcinfo = next(parsed)
+				if cache is not None and unchanged(filename, before[filename]): cache.put(filename, srcinfo, before[filename])
 			srcinfo.directory = directory
 			result[directory] = srcinfo
 		return result
@@ -135,5 +182,38 @@ class SrcInfo:
 		return result
 
 	@classmethod
-	def load_db_indexed_by_pkgname(cls, root):
-		return cls.index_by_pkgname(cls.load_db(root))
+	def load_db_indexed_by_pkgname(cls, root, jobs = 1, cache = None, ignore = ()):
+		return cls.index_by_pkgname(cls.load_db(root, jobs, cache, ignore))
+
+class SrcInfoCache(FileCache):
+	"""
+	A persistent cache of parsed .SRCINFO files.
+	The cache is stored in an SQLite database.
+	Entries are keyed by the path of the file and are invalidated when the size or modification time changes.
+	"""
+	table   = 'srcinfo'
+	columns = ('data',)
+
+	def get(self, filename):
+		"""
+		Get the cached SrcInfo for a file, or None if there is no valid cache entry.
+		"""
+		row = self.get_row(filename)
+		if row is None: return None
+
+		data            = json.loads(row[0])
+		result          = SrcInfo(os.path.dirname(filename))
+		result.pkgbase  = package_from_data(data['pkgbase']) if data['pkgbase'] is not None else None
+		result.pkgnames = [package_from_data(x) for x in data['pkgnames']]
+		return result
+
+	def put(self, filename, srcinfo, stat = None):
+		"""
+		Add or replace the cache entry for a file.
+		If stat is given, the entry is stored for the file as it was when that stat was taken, see FileCache.put_row().
+		"""
+		data = {
+			'pkgbase':  srcinfo.pkgbase.data if srcinfo.pkgbase is not None else None,
+			'pkgnames': [x.data for x in srcinfo.pkgnames],
+		}
+		self.put_row(filename, (json.dumps(data),), stat)
@@ -0,0 +1,212 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Lightweight instrumentation with named timing spans, counters and optional memory peaks.
+
+Instrumentation is disabled by default. While disabled, span() returns a shared no-op
+context manager and hot code paths only test the enabled flag.
+Statistics are collected per process: work done in worker processes is not included.
+The memory peak of a span is the highest traced memory while it was active, including nested spans.
+Spans and counters may be used from several threads. Spans nest per thread,
+but the traced memory is shared, so a peak counts for the active spans of all threads.
+"""
+
+import json
+import sys
+import threading
+import time
+import tracemalloc
+
+enabled  = False
+memory   = False
+spans    = {}
+counters = {}
+peaks    = {}
+
+# Guards spans, counters, peaks and the peak stacks against concurrent updates.
+_lock = threading.Lock()
+
+# The memory peaks of the active spans of each thread, not counting the current tracemalloc peak, innermost last.
+# _local.peak_stack is the stack of the current thread, _peak_stacks holds the stacks of all threads by thread id.
+_local        = threading.local()
+_peak_stacks  = {}
+_process_peak = 0
+
+def _peak_stack():
+	stack = getattr(_local, 'peak_stack', None)
+	if stack is None:
+		stack = _local.peak_stack = []
+		with _lock: _peak_stacks[threading.get_ident()] = stack
+	return stack
+
+def _fold_peak():
+	"""
+	Add the current tracemalloc peak to the innermost active span of each thread and the process peak, and reset it.
+	Must be called with _lock held.
+	"""
+	global _process_peak
+	peak = tracemalloc.get_traced_memory()[1]
+	for stack in _peak_stacks.values():
+		if stack: stack[-1] = max(stack[-1], peak)
+	_process_peak = max(_process_peak, peak)
+	tracemalloc.reset_peak()
+
+class _Span:
+	__slots__ = ('name', 'start')
+
+	def __init__(self, name):
+		self.name  = name
+		self.start = None
+
+	def __enter__(self):
+		if memory:
+			stack = _peak_stack()
+			with _lock:
+				_fold_peak()
+				stack.append(0)
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *args):
+		elapsed = time.perf_counter() - self.start
+		stack   = _peak_stack() if memory else None
+		with _lock:
+			entry = spans.get(self.name)
+			if entry is None:
+				spans[self.name] = [1, elapsed]
+			else:
+				entry[0] += 1
+				entry[1] += elapsed
+			if stack:
+				# The peak of this span is the peak since it started, also over nested spans.
+				_fold_peak()
+				peak = stack.pop()
+				peaks[self.name] = max(peaks.get(self.name, 0), peak)
+				if stack: stack[-1] = max(stack[-1], peak)
+
+class _NullSpan:
+	__slots__ = ()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		pass
+
+_NULL_SPAN = _NullSpan()
+
+def enable(trace_memory = False):
+	"""
+	Enable instrumentation, optionally tracing memory allocations with tracemalloc.
+	"""
+	global enabled, memory
+	enabled = True
+	memory  = trace_memory
+	if memory and not tracemalloc.is_tracing():
+		tracemalloc.start()
+
+def disable():
+	global enabled, memory
+	if memory and tracemalloc.is_tracing():
+		tracemalloc.stop()
+	enabled = False
+	memory  = False
+
+def reset():
+	global _process_peak
+	with _lock:
+		spans.clear()
+		counters.clear()
+		peaks.clear()
+		for stack in _peak_stacks.values(): stack.clear()
+		_process_peak = 0
+
+def span(name):
+	"""
+	Get a context manager that adds the time spent in it to the named span.
+	"""
+	if not enabled: return _NULL_SPAN
+	return _Span(name)
+
+def count(name, amount = 1):
+	"""
+	Add an amount to a named counter.
+	"""
+	if not enabled: return
+	with _lock: counters[name] = counters.get(name, 0) + amount
+
+def report():
+	"""
+	Get the collected statistics as a dictionary.
+	"""
+	with _lock:
+		result = {
+			'spans':    {name: {'count': entry[0], 'seconds': entry[1]} for name, entry in spans.items()},
+			'counters': dict(counters),
+		}
+		if memory:
+			result['memory_peak'] = dict(peaks)
+			result['memory_peak_total'] = max(_process_peak, tracemalloc.get_traced_memory()[1])
+	return result
+
+def print_report(file = sys.stderr):
+	"""
+	Print the collected statistics in human readable form.
+	"""
+	data = report()
+	for name, entry in data['spans'].items():
+		print('{:<40} {:>6}x {:>10.4f}s'.format(name, entry['count'], entry['seconds']), file=file)
+	for name, value in data['counters'].items():
+		print('{:<40} {:>18}'.format(name, value), file=file)
+	for name, value in data.get('memory_peak', {}).items():
+		print('{:<40} {:>14.1f} MiB'.format('peak memory: ' + name, value / 2**20), file=file)
+
+def add_arguments(parser):
+	"""
+	Add the --stats, --stats-json and --stats-memory options to an argument parser.
+	"""
+	parser.add_argument('--stats',        dest='stats',        action='store_true', help='Print timing statistics to standard error.')
+	parser.add_argument('--stats-json',   dest='stats_json',   default=None,        help='Write timing statistics as JSON to the given file.')
+	parser.add_argument('--stats-memory', dest='stats_memory', action='store_true', help='Also record memory peaks (slow).')
+
+def setup(options):
+	"""
+	Enable instrumentation if requested by the options added with add_arguments().
+	"""
+	if options.stats or options.stats_json or options.stats_memory:
+		enable(options.stats_memory)
+
+def finish(options):
+	"""
+	Output the statistics as requested by the options added with add_arguments().
+	"""
+	if not enabled: return
+	if options.stats or (options.stats_memory and not options.stats_json):
+		print_report()
+	if options.stats_json:
+		with open(options.stats_json, 'w') as file:
+			json.dump(report(), file, indent=2)
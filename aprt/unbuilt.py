@@ -0,0 +1,147 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import logging
+
+from . import graph
+from . import stats
+from .package import dependency_graph, search_reverse_dependencies
+
+def is_unbuilt(pkgbuild, database, allow_downgrade=False):
+	if pkgbuild.name not in database:
+		logging.info("Package `{}' ({}) is does not exist in the repositories.".format(pkgbuild.name, pkgbuild.version()))
+		return True
+
+	package = database[pkgbuild.name]
+	diff    = pkgbuild.version().__cmp__(package.version())
+
+	if diff == 0:
+		logging.debug("PKGBUILD `{}' specifies the same version ({}) as the repositories.".format(pkgbuild.name, pkgbuild.version()))
+		return False
+
+	if diff > 0:
+		logging.info("PKGBUILD `{}' specifies newer version ({}) than repositories ({}).".format(pkgbuild.name, pkgbuild.version(), package.version()))
+		return True
+
+	if diff < 0:
+		logging.warning("Built package `{}' ({}) is newer than PKGBUILD ({}).".format(pkgbuild.name, package.version(), pkgbuild.version()))
+		return allow_downgrade
+
+	return False
+
+def srcinfo_alldepends(srcinfo):
+	for package in srcinfo.packages():
+		yield from package.alldepends()
+
+def srcinfo_provides(srcinfo):
+	for package in srcinfo.packages():
+		yield from package.provides()
+
+def srcinfo_by_provides(srcinfos):
+	result = {}
+	for srcinfo in srcinfos:
+		for provide in srcinfo_provides(srcinfo):
+			if provide.name not in result: result[provide.name] = set()
+			result[provide.name].add(srcinfo.directory)
+	return result
+
+def srcinfo_graph(srcinfos):
+	"""
+	Build the DependencyGraph between the directories of a set of SRCINFO files.
+	A directory has an edge to every other directory that provides one of its dependencies.
+	"""
+	with stats.span('unbuilt.srcinfo_graph'):
+		srcinfos    = list(srcinfos)
+		names       = [srcinfo.directory for srcinfo in srcinfos]
+		ids         = {name: id for id, name in enumerate(names)}
+		provided_by = {name: [ids[directory] for directory in directories] for name, directories in srcinfo_by_provides(srcinfos).items()}
+
+		rows = []
+		for id, srcinfo in enumerate(srcinfos):
+			row = set()
+			for depend in srcinfo_alldepends(srcinfo):
+				row.update(provided_by.get(depend.name, ()))
+			row.discard(id)
+			rows.append(sorted(row))
+		return graph.DependencyGraph.from_rows(names, rows)
+
+def srcinfo_neighbours(srcinfos):
+	return srcinfo_graph(srcinfos).table()
+
+def sort_buildorder(directories, srcinfos):
+	return graph.build_order(srcinfo_graph(srcinfos), directories)
+
+def build_waves(directories, srcinfos):
+	return graph.build_waves(srcinfo_graph(srcinfos), directories)
+
+def srcinfo_packages(srcinfo_db):
+	"""
+	Get a dictionary of all packages described by a SRCINFO database indexed by pkgname.
+	"""
+	packages = {}
+	for srcinfo in srcinfo_db.values():
+		for package in srcinfo.packages():
+			packages[package.name] = package
+	return packages
+
+def srcinfo_package_graph(srcinfo_db):
+	"""
+	Get the DependencyGraph of the packages in a SRCINFO database.
+	"""
+	return dependency_graph(srcinfo_packages(srcinfo_db).values())
+
+def find_unbuilt(srcinfo_db, database, allow_downgrade = False):
+	"""
+	Find packages in a SRCINFO database indexed by pkgname that are not built in a package database.
+	Returns a tuple (directories, pkgnames) of the directories and names of the unbuilt packages.
+	"""
+	unbuilt      = set()
+	unbuilt_pkgs = set()
+	for srcinfo in srcinfo_db.values():
+		for package in srcinfo.packages():
+			if is_unbuilt(package, database, allow_downgrade=allow_downgrade):
+				unbuilt_pkgs.add(package.name)
+				unbuilt.add(srcinfo.directory)
+	return unbuilt, unbuilt_pkgs
+
+def list_unbuilt(srcinfo_db, database, reverse_deps = False, no_unbuilt = False, allow_downgrade = False, package_graph = None):
+	"""
+	Get the set of directories of unbuilt packages and/or their reverse dependencies.
+	The package graph from srcinfo_package_graph() is computed if it is not given.
+	"""
+	unbuilt, unbuilt_pkgs = find_unbuilt(srcinfo_db, database, allow_downgrade)
+
+	unbuilt_reverse_deps = set()
+	if reverse_deps:
+		if package_graph is None: package_graph = srcinfo_package_graph(srcinfo_db)
+		dependents = search_reverse_dependencies(package_graph, unbuilt_pkgs)
+		unbuilt_reverse_deps.update(map(lambda x: srcinfo_db[x].directory, dependents))
+		unbuilt_reverse_deps.difference_update(unbuilt)
+
+	output = set()
+	if not no_unbuilt: output |= unbuilt
+	if reverse_deps:   output |= unbuilt_reverse_deps
+	return output
@@ -0,0 +1,178 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import collections.abc
+import concurrent.futures
+import os
+
+from . import alpm
+from . import stats
+from .mapped import MappedRepository, default_path, load_mapped_repository
+from .package import ProvidesIndex
+
+class Layer:
+	"""
+	A named dictionary of packages in a universe, usually a repository database.
+	"""
+	def __init__(self, name, packages):
+		self.name     = name
+		self.packages = packages
+
+	def __repr__(self):
+		return '{{Layer: {}, packages: {}}}'.format(self.name, len(self.packages))
+
+class _LazyProvidesIndex(ProvidesIndex):
+	"""
+	A ProvidesIndex of a universe that indexes each name when it is first looked up.
+	Layers backed by a MappedRepository list the providers of a name from their snapshot,
+	so only the packages that are actually used get decoded.
+	Other layers are indexed as a whole on first use.
+	"""
+	def __init__(self, universe):
+		super().__init__()
+		self.universe = universe
+		self.layers   = [None] * len(universe.layers)
+
+	def _layer_provider_names(self, position, name):
+		packages = self.universe.layers[position].packages
+		if isinstance(packages, MappedRepository): return packages.provider_names(name)
+		if self.layers[position] is None: self.layers[position] = ProvidesIndex(packages.values())
+		return self.layers[position].provider_names(name)
+
+	def add(self, package):
+		raise RuntimeError('can not add packages to the provides index of a universe')
+
+	def provider_names(self, name):
+		result = self.names.get(name)
+		if result is None:
+			# Only count providers from the layer that owns them, later layers shadow earlier ones.
+			owner  = self.universe.owner
+			result = set()
+			for position in range(len(self.universe.layers)):
+				result.update(x for x in self._layer_provider_names(position, name) if owner[x] == position)
+			self.names[name] = result
+		return result
+
+	def provider_entries(self, name):
+		result = self.providers.get(name)
+		if result is None:
+			result = []
+			for package in map(self.universe.__getitem__, sorted(self.provider_names(name))):
+				result += [(package, self.provide_version(package, x)) for x in package.provides() if x.name == name]
+			self.providers[name] = result
+		return result
+
+class Universe(collections.abc.Mapping):
+	"""
+	A set of repositories stacked as ordered layers.
+
+	The universe behaves as a read-only dictionary of packages by name.
+	Later layers take precedence over earlier layers, like repeated dict.update() calls,
+	but the packages are not copied.
+	"""
+	def __init__(self, layers = ()):
+		self.layers = []
+		self.owner  = {}
+		self.index  = None
+		for name, packages in layers:
+			self.add_layer(name, packages)
+
+	@classmethod
+	def load(cls, filenames, jobs = None, mapped = False, snapshot_dir = None):
+		"""
+		Load repository database files as layers, in the given order.
+		The files are read concurrently by a pool of threads.
+		A value of None for jobs uses the default number of threads.
+
+		If mapped is true, the databases are loaded through binary snapshots (see mapped.MappedRepository).
+		The snapshots are stored in snapshot_dir, or next to the databases if it is None.
+		"""
+		def load_one(filename):
+			if not mapped: return alpm.read_package_db_file(filename)
+			return load_mapped_repository(filename, default_path(filename, snapshot_dir))
+
+		with stats.span('universe.load'):
+			filenames = list(filenames)
+			if mapped and snapshot_dir is not None: os.makedirs(snapshot_dir, exist_ok=True)
+			with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+				repositories = list(executor.map(load_one, filenames))
+			return cls(zip(filenames, repositories))
+
+	def add_layer(self, name, packages):
+		"""
+		Add a dictionary of packages as a new layer on top of the existing layers.
+		"""
+		position = len(self.layers)
+		self.layers.append(Layer(name, packages))
+		for package_name in packages:
+			self.owner[package_name] = position
+		self.index = None
+
+	def layer_of(self, name):
+		"""
+		Get the layer that provides the package with the given name.
+		"""
+		return self.layers[self.owner[name]]
+
+	def duplicates(self):
+		"""
+		Get a dictionary of package names that occur in more than one layer,
+		with the list of layer names containing each of them.
+		"""
+		seen   = {}
+		for layer in self.layers:
+			for name in layer.packages:
+				seen.setdefault(name, []).append(layer.name)
+		return {name: layers for name, layers in seen.items() if len(layers) > 1}
+
+	def provides_index(self):
+		"""
+		Get the ProvidesIndex of all visible packages.
+		The index is built on first use and shared until a layer is added.
+		If a layer is a MappedRepository, the index is filled per name when it is looked up,
+		so the packages of the snapshot are not all decoded.
+		"""
+		if self.index is None:
+			if any(isinstance(layer.packages, MappedRepository) for layer in self.layers):
+				self.index = _LazyProvidesIndex(self)
+			else:
+				self.index = ProvidesIndex(self.values())
+		return self.index
+
+	def __getitem__(self, name):
+		return self.layers[self.owner[name]].packages[name]
+
+	def __contains__(self, name):
+		return name in self.owner
+
+	def __iter__(self):
+		return iter(self.owner)
+
+	def __len__(self):
+		return len(self.owner)
+
+	def __repr__(self):
+		return '{{Universe: {}}}'.format(self.layers)
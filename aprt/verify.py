@@ -0,0 +1,203 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import concurrent.futures
+import contextlib
+import hashlib
+import os
+
+from . import alpm
+from . import stats
+from .cache import FileCache, unchanged
+
+# The size of the reads used to hash package archives.
+HASH_BLOCK_SIZE = 1 << 20
+
+PACKAGE_SUFFIXES = ('.pkg.tar', '.pkg.tar.bz2', '.pkg.tar.gz', '.pkg.tar.xz', '.pkg.tar.zst')
+
+def is_package_file(filename):
+	""" Check if a file name looks like a package archive. """
+	return filename.endswith(PACKAGE_SUFFIXES)
+
+def hash_file(filename, block_size = HASH_BLOCK_SIZE):
+	"""
+	Compute the hex encoded sha256sum of a file.
+	The file is read in large blocks into a single reusable buffer.
+	"""
+	return hash_file_digests(filename, ('sha256',), block_size)[0]
+
+def hash_file_digests(filename, algorithms, block_size = HASH_BLOCK_SIZE):
+	"""
+	Compute the hex encoded digests of a file for several hash algorithms in a single pass.
+	Returns a list with a digest for each algorithm.
+	"""
+	digests = [hashlib.new(algorithm) for algorithm in algorithms]
+	buffer  = bytearray(block_size)
+	view    = memoryview(buffer)
+	total   = 0
+	with open(filename, 'rb', buffering=0) as file:
+		while True:
+			size = file.readinto(buffer)
+			if not size: break
+			for digest in digests:
+				digest.update(view[:size])
+			total += size
+	if stats.enabled: stats.count('verify.bytes_hashed', total)
+	return [digest.hexdigest() for digest in digests]
+
+class HashCache(FileCache):
+	"""
+	A persistent cache of the sha256sums of package archives.
+	The cache is stored in an SQLite database.
+	Entries are keyed by the path of the archive and are invalidated when the size or modification time changes.
+	"""
+	table   = 'hashes'
+	columns = ('sha256sum',)
+
+	@staticmethod
+	def default_path(db_filename):
+		"""
+		Get the default location of the hash cache for the archives of a repository database.
+		"""
+		return db_filename + '.hashes.sqlite'
+
+	def get(self, filename, stat = None):
+		"""
+		Get the cached sha256sum of a file, or None if there is no valid cache entry.
+		If stat is given, it is used instead of calling os.stat() again.
+		"""
+		row = self.get_row(filename, stat)
+		return row[0] if row is not None else None
+
+	def put(self, filename, sha256sum, stat = None):
+		"""
+		Add or replace the cache entry for a file.
+		"""
+		self.put_row(filename, (sha256sum,), stat)
+
+class VerifyResult:
+	"""
+	The result of verifying the archives of a repository.
+	result.missing and result.extra hold sets of file names,
+	result.size_mismatch maps file names to (expected, actual) sizes and
+	result.checksum_mismatch maps file names to (expected, actual) sha256sums.
+	"""
+	def __init__(self):
+		self.missing           = set()
+		self.extra             = set()
+		self.size_mismatch     = {}
+		self.checksum_mismatch = {}
+		self.verified          = 0
+
+	def ok(self):
+		""" Check if no problems were found. """
+		return not (self.missing or self.extra or self.size_mismatch or self.checksum_mismatch)
+
+	def __repr__(self):
+		return '{{VerifyResult: verified: {}, missing: {}, extra: {}, size mismatch: {}, checksum mismatch: {}}}'.format(
+			self.verified, sorted(self.missing), sorted(self.extra), sorted(self.size_mismatch), sorted(self.checksum_mismatch)
+		)
+
+def verify_repository(repository, repository_dir, jobs = 1, cache = None, extra = True):
+	"""
+	Verify the archives of a repository against the %CSIZE% and %SHA256SUM% entries of its database.
+	The repository is a dictionary of packages as returned by alpm.read_package_db_file().
+
+	The size of each archive is checked before it is hashed, so truncated archives are never read.
+	If jobs is not 1, archives are hashed by a pool of worker threads (0 or None to use all CPUs).
+	If a cache is given, only archives without a valid cache entry are hashed.
+	New hashes are only cached if the archive did not change while it was hashed.
+	If extra is true, package archives in the directory that are not in the database are reported too.
+	"""
+	result    = VerifyResult()
+	to_hash   = []
+	expected  = {}
+	filenames = set()
+
+	for package in repository.values():
+		filename = package.get_value('filename')
+		if not filename:
+			raise RuntimeError(f"package has no known filename: {package.name}")
+		filenames.add(filename)
+		path = os.path.join(repository_dir, filename)
+
+		try:
+			stat = os.stat(path)
+		except FileNotFoundError:
+			result.missing.add(filename)
+			continue
+
+		csize = package.get_value('csize')
+		if csize is not None and int(csize) != stat.st_size:
+			result.size_mismatch[filename] = (int(csize), stat.st_size)
+			continue
+
+		sha256sum = package.get_value('sha256sum')
+		if sha256sum is None:
+			result.verified += 1
+			continue
+
+		actual = cache.get(path, stat) if cache is not None else None
+		stats.count('verify.cache_hits' if actual is not None else 'verify.cache_misses')
+		if actual is None:
+			to_hash.append((filename, path, stat))
+			expected[filename] = sha256sum
+		elif actual != sha256sum:
+			result.checksum_mismatch[filename] = (sha256sum, actual)
+		else:
+			result.verified += 1
+
+	with contextlib.ExitStack() as stack, stats.span('verify.hash'):
+		paths = [path for _, path, _ in to_hash]
+		if jobs == 1:
+			hashes = map(hash_file, paths)
+		else:
+			jobs     = jobs or os.cpu_count() or 1
+			executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor(jobs))
+			hashes   = executor.map(hash_file, paths)
+
+		for (filename, path, stat), actual in zip(to_hash, hashes):
+			if cache is not None and unchanged(path, stat): cache.put(path, actual, stat)
+			if actual != expected[filename]:
+				result.checksum_mismatch[filename] = (expected[filename], actual)
+			else:
+				result.verified += 1
+
+	if extra:
+		with os.scandir(repository_dir or '.') as entries:
+			for entry in entries:
+				if entry.name in filenames or not is_package_file(entry.name): continue
+				if entry.is_file(): result.extra.add(entry.name)
+
+	return result
+
+def verify_repository_file(filename, jobs = 1, cache = None, extra = True):
+	"""
+	Verify the archives next to a repository database file.
+	See verify_repository().
+	"""
+	repository = alpm.read_package_db_file(filename, {'filename', 'csize', 'sha256sum'})
+	return verify_repository(repository, os.path.dirname(filename), jobs, cache, extra)
@@ -26,6 +26,11 @@
 
 import functools
 
+from . import stats
+
+# Maximum number of parsed version strings kept by Version.parse().
+PARSE_CACHE_SIZE = 65536
+
 def _split_if(string, condition):
 	start  = 0
 	triggered = False
@@ -45,6 +50,9 @@ def _strcmp(a, b):
 	return _cmp(len(a), len(b))
 
 
+# Sorts above the key of any version component part.
+_TERMINATOR = (2,)
+
 @functools.total_ordering
 class VersionComponent:
 	"""
@@ -54,6 +62,7 @@ class VersionComponent:
 	def __init__(self, component):
 		self.original = component;
 		self.parts    = list(self.__class__.split_parts(component));
+		self.key      = self.__class__.make_key(self.parts)
 
 	@staticmethod
 	def split_parts(component):
@@ -74,6 +83,22 @@ class VersionComponent:
 				numeric = not numeric
 		yield component[start:]
 
+	@staticmethod
+	def make_key(parts):
+		"""
+		Make a tuple that orders the same as comparing the given parts with __cmp__.
+		Decimal parts sort above alphabetical parts and longer decimal parts sort above shorter ones.
+		The terminator makes a component with fewer parts sort above a component it is a prefix of.
+		"""
+		key = []
+		for part in parts:
+			if part.isdecimal():
+				key.append((1, len(part), part))
+			else:
+				key.append((0, part))
+		key.append(_TERMINATOR)
+		return tuple(key)
+
 	def __str__(self):
 		return ''.join(self.parts)
 
@@ -107,6 +132,16 @@ class VersionComponent:
 		return self.__cmp__(other) < 0
 
 
+def compare_versions(lhs, rhs):
+	"""
+	Compare two parallel sequences of versions.
+	Returns a list with the result of __cmp__ for each pair: -1, 0 or 1.
+	Raises ValueError if the sequences have different lengths.
+	"""
+	if len(lhs) != len(rhs):
+		raise ValueError(f"can not compare {len(lhs)} versions with {len(rhs)} versions")
+	return [a.__cmp__(b) for a, b in zip(lhs, rhs)]
+
 def _format_pkgver(pkgver):
 	return '.'.join(map(lambda x: str(x), pkgver))
 
@@ -123,11 +158,26 @@ class Version:
 		self.pkgver = list(self.__class__.split_components(pkgver))
 		self.pkgrel = list(self.__class__.split_components(pkgrel)) if pkgrel is not None else None
 		self.epoch  = int(epoch) if epoch is not None else 0
+		self.pkgver_key = tuple(x.key for x in self.pkgver)
+		self.pkgrel_key = tuple(x.key for x in self.pkgrel) if self.pkgrel is not None else None
+		if stats.enabled: stats.count('version.parsed')
+
+	@property
+	def key(self):
+		"""
+		A hashable key that orders the same as comparing versions with __cmp__.
+
+		Note that __cmp__ ignores the pkgrel if either version has none,
+		while the key sorts a version without pkgrel below the same version with a pkgrel.
+		"""
+		return (self.epoch, self.pkgver_key, self.pkgrel_key or ())
 
 	@staticmethod
+	@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
 	def parse(string):
 		"""
 		Parse a version string.
+		The results are cached, so the returned versions should not be modified.
 		"""
 		# Parse optional epoch.
 		epoch, sep, rest = string.partition(':')
@@ -186,15 +236,19 @@ class Version:
 		if self.epoch != other.epoch: return _cmp(self.epoch, other.epoch)
 
 		# The pkgver is the next deciding factor,
-		pkgver_dif = _cmp(self.pkgver, other.pkgver)
+		pkgver_dif = _cmp(self.pkgver_key, other.pkgver_key)
 		if pkgver_dif != 0: return pkgver_dif
 
 		# The pkgrel only weighs in if both version have the pkgrel specified.
-		if self.pkgrel is None or other.pkgrel is None: return 0
-		return _cmp(self.pkgrel, other.pkgrel);
+		if self.pkgrel_key is None or other.pkgrel_key is None: return 0
+		return _cmp(self.pkgrel_key, other.pkgrel_key);
 
 	def __eq__(self, other):
 		return self.__cmp__(other) == 0
 
+	def __hash__(self):
+		# The pkgrel is not always used for equality, so it can not be part of the hash.
+		return hash((self.epoch, self.pkgver_key))
+
 	def __lt__(self, other):
 		return self.__cmp__(other) < 0
@@ -0,0 +1,231 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Generators for synthetic repositories and PKGBUILD trees used by the benchmarks.
+"""
+
+import argparse
+import hashlib
+import os
+import random
+
+import libarchive
+
+SHAPES = ('chain', 'fan-in', 'cycles', 'virtual', 'mixed')
+
+class GeneratedPackage:
+	"""
+	A generated package.
+	Split packages share the base and version of their pkgbase.
+	Packages generated with a dependency that closes a cycle are marked as cyclic.
+	"""
+	def __init__(self, name, base, version, depends, provides, cyclic = False):
+		self.name     = name
+		self.base     = base
+		self.version  = version
+		self.depends  = depends
+		self.provides = provides
+		self.cyclic   = cyclic
+
+	@property
+	def filename(self):
+		return '{}-{}-x86_64.pkg.tar.gz'.format(self.name, self.version)
+
+def generate_packages(count, shape = 'mixed', split = 0.1, seed = 0):
+	"""
+	Generate a list of packages with a dependency graph of the given shape.
+
+	chain:   each package depends on the previous one.
+	fan-in:  all packages depend on a few core packages.
+	cycles:  packages form small dependency cycles that also depend on the previous cycle.
+	virtual: packages depend on virtual names provided by other packages.
+	mixed:   a random combination of the above.
+
+	A fraction split of the packages is a split package of the previous package.
+	"""
+	if shape not in SHAPES: raise ValueError("Invalid shape `{}'.".format(shape))
+	rng      = random.Random(seed)
+	packages = []
+	for index in range(count):
+		name = 'pkg{:06}'.format(index)
+		if packages and rng.random() < split:
+			base    = packages[-1].base
+			version = packages[-1].version
+		else:
+			base    = name
+			version = '{}.{}.{}-{}'.format(rng.randint(0, 20), rng.randint(0, 99), rng.randint(0, 9), rng.randint(1, 5))
+
+		depends  = []
+		provides = []
+		kind     = shape if shape != 'mixed' else rng.choice(SHAPES[:-1])
+		if index > 0:
+			if kind == 'chain':
+				depends.append(packages[index - 1].name)
+			elif kind == 'fan-in':
+				depends += ['pkg{:06}'.format(x) for x in rng.sample(range(min(index, 10)), min(index, 3))]
+			elif kind == 'cycles':
+				group = index - index % 3
+				depends.append('pkg{:06}'.format(group + (index + 1) % 3))
+				if group > 0: depends.append('pkg{:06}'.format(group - 1))
+			elif kind == 'virtual':
+				depends.append('virtual{:06}>=1'.format(rng.randrange(index)))
+		provides.append('virtual{:06}={}'.format(index, version.partition('-')[0]))
+
+		packages.append(GeneratedPackage(name, base, version, depends, provides, index > 0 and kind == 'cycles'))
+
+	# Cycle dependencies may point past the last package, drop those.
+	names = {package.name for package in packages}
+	for package in packages:
+		package.depends = [x for x in package.depends if x.startswith('virtual') or x in names]
+	return packages
+
+def update_packages(packages, fraction = 0.1, seed = 0):
+	"""
+	Get a copy of a list of packages where a fraction of the pkgbases has a newer pkgver.
+	The version of the virtual names they provide is updated too.
+	Pkgbases with packages in a dependency cycle are never updated, so a build order exists for the updated packages.
+	"""
+	rng     = random.Random(seed)
+	by_name = {package.name: package for package in packages}
+	cyclic  = set()
+	for package in packages:
+		if not package.cyclic: continue
+		cyclic.add(package.base)
+		cyclic.update(by_name[x].base for x in package.depends if x in by_name)
+	bases   = sorted({package.base for package in packages} - cyclic)
+	updated = set(rng.sample(bases, int(len(bases) * fraction)))
+	result  = []
+	for package in packages:
+		if package.base not in updated:
+			result.append(package)
+			continue
+		pkgver, _, pkgrel = package.version.rpartition('-')
+		major, minor, patch = pkgver.split('.')
+		new_pkgver = '{}.{}.{}'.format(major, minor, int(patch) + 1)
+		provides   = [x[:-len(pkgver)] + new_pkgver if x.endswith('=' + pkgver) else x for x in package.provides]
+		result.append(GeneratedPackage(package.name, package.base, '{}-{}'.format(new_pkgver, pkgrel), package.depends, provides, package.cyclic))
+	return result
+
+def format_alpm(sections):
+	return ''.join('%{}%\n{}\n\n'.format(key, '\n'.join(values)) for key, values in sections if values)
+
+def write_repository_db(filename, packages, builddate = 1500000000):
+	"""
+	Write a repository database for the packages using libarchive.
+	"""
+	with libarchive.file_writer(filename, 'ustar', 'gzip') as archive:
+		for package in packages:
+			checksum = hashlib.sha256(package.filename.encode()).hexdigest()
+			desc = format_alpm([
+				('FILENAME',  [package.filename]),
+				('NAME',      [package.name]),
+				('BASE',      [package.base]),
+				('VERSION',   [package.version]),
+				('DESC',      ['Generated package {}'.format(package.name)]),
+				('CSIZE',     ['1024']),
+				('ISIZE',     ['4096']),
+				('SHA256SUM', [checksum]),
+				('ARCH',      ['x86_64']),
+				('BUILDDATE', [str(builddate)]),
+				('PACKAGER',  ['Benchmark <benchmark@example.com>']),
+				('DEPENDS',   package.depends),
+				('PROVIDES',  package.provides),
+			]).encode()
+			archive.add_file_from_memory('{}-{}/desc'.format(package.name, package.version), len(desc), desc)
+
+def write_package_archives(directory, packages, installed_offset = 0):
+	"""
+	Write minimal package archives holding a .PKGINFO and .BUILDINFO for each package.
+	The installed versions of the dependencies have installed_offset added to their pkgrel.
+	"""
+	by_name = {package.name: package for package in packages}
+	for package in packages:
+		pkgver, _, pkgrel = package.version.rpartition('-')
+		installed = []
+		for depend in package.depends:
+			if depend in by_name:
+				dep_pkgver, _, dep_pkgrel = by_name[depend].version.rpartition('-')
+				installed.append('{}-{}-{}-x86_64'.format(depend, dep_pkgver, int(dep_pkgrel) + installed_offset))
+		pkginfo   = 'pkgname = {}\npkgbase = {}\npkgver = {}\n'.format(package.name, package.base, package.version)
+		pkginfo  += ''.join('depend = {}\n'.format(x) for x in package.depends)
+		buildinfo = 'format = 2\npkgname = {}\npkgbase = {}\npkgver = {}\n'.format(package.name, package.base, package.version)
+		buildinfo += ''.join('installed = {}\n'.format(x) for x in installed)
+		with libarchive.file_writer(os.path.join(directory, package.filename), 'ustar', 'gzip') as archive:
+			for name, data in (('.PKGINFO', pkginfo.encode()), ('.BUILDINFO', buildinfo.encode())):
+				archive.add_file_from_memory(name, len(data), data)
+
+def write_srcinfo_tree(root, packages):
+	"""
+	Write a directory with a PKGBUILD and .SRCINFO for each pkgbase.
+	"""
+	bases = {}
+	for package in packages:
+		bases.setdefault(package.base, []).append(package)
+
+	for base, members in bases.items():
+		pkgver, _, pkgrel = members[0].version.rpartition('-')
+		directory = os.path.join(root, base[:5], base)
+		os.makedirs(directory, exist_ok=True)
+		lines = ['pkgbase = {}'.format(base), '\tpkgver = {}'.format(pkgver), '\tpkgrel = {}'.format(pkgrel), '\tarch = x86_64']
+		for package in members:
+			lines += ['', 'pkgname = {}'.format(package.name)]
+			lines += ['\tdepends = {}'.format(x) for x in package.depends]
+			lines += ['\tprovides = {}'.format(x) for x in package.provides]
+		with open(os.path.join(directory, '.SRCINFO'), 'w') as file:
+			file.write('\n'.join(lines) + '\n')
+		with open(os.path.join(directory, 'PKGBUILD'), 'w') as file:
+			file.write('pkgbase={}\npkgver={}\npkgrel={}\n'.format(base, pkgver, pkgrel))
+
+def generate(directory, count, shape = 'mixed', split = 0.1, seed = 0, archives = True, updated = 0.1):
+	"""
+	Generate a repository database, package archives and a PKGBUILD tree in a directory.
+	A second PKGBUILD tree (pkgbuild-updated) has a newer version for the fraction updated of the pkgbases,
+	so tools looking for unbuilt packages have work to do.
+	Returns the list of generated packages.
+	"""
+	packages = generate_packages(count, shape, split, seed)
+	repo_dir = os.path.join(directory, 'repo')
+	os.makedirs(repo_dir, exist_ok=True)
+	write_repository_db(os.path.join(repo_dir, 'bench.db'), packages)
+	if archives: write_package_archives(repo_dir, packages, installed_offset=-1)
+	write_srcinfo_tree(os.path.join(directory, 'pkgbuild'), packages)
+	write_srcinfo_tree(os.path.join(directory, 'pkgbuild-updated'), update_packages(packages, updated, seed))
+	return packages
+
+def main():
+	parser = argparse.ArgumentParser(description='Generate a synthetic repository and PKGBUILD tree.')
+	parser.add_argument('directory',                                                             help='The directory to generate the data in.')
+	parser.add_argument('-n', '--count',   dest='count',   type=int,   default=1000,             help='The number of packages to generate.')
+	parser.add_argument('-s', '--shape',   dest='shape',   choices=SHAPES, default='mixed',      help='The shape of the dependency graph.')
+	parser.add_argument('--split',         dest='split',   type=float, default=0.1,              help='The fraction of split packages.')
+	parser.add_argument('--seed',          dest='seed',    type=int,   default=0,                help='The random seed.')
+	parser.add_argument('--updated',       dest='updated', type=float, default=0.1,              help='The fraction of pkgbases with a newer version in the updated PKGBUILD tree.')
+	parser.add_argument('--no-archives',   dest='archives', action='store_false',                help='Do not generate package archives.')
+	options = parser.parse_args()
+	generate(options.directory, options.count, options.shape, options.split, options.seed, options.archives, options.updated)
+
+if __name__ == '__main__': main()
@@ -0,0 +1,153 @@
+# Copyright 2017 Delft Robotics BV
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Benchmark the aprt library entry points and the bin/aprt-* workflows on generated data.
+
+The benchmarks measure the aprt package and the bin/aprt-* scripts of the source checkout they are part of,
+never an installed copy, so they must be run from a checkout: python benchmarks/run.py.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import generate
+
+# The root of the source checkout, it is put in front of sys.path so the checkout is imported instead of an installed aprt.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if not os.path.isfile(os.path.join(ROOT, 'aprt', '__init__.py')):
+	sys.exit(f'{__file__} must be run from an aprt source checkout, but {ROOT} does not contain the aprt package')
+sys.path.insert(0, ROOT)
+
+import aprt
+from aprt.outdated import find_outdated
+
+def measure(function, repeat, setup = None):
+	"""
+	Run a function a number of times and return the best and mean wall-clock time in seconds.
+	If a setup function is given, it is run before each run of the function without being timed.
+	"""
+	times = []
+	for _ in range(repeat):
+		if setup is not None: setup()
+		start = time.perf_counter()
+		function()
+		times.append(time.perf_counter() - start)
+	return {'best': min(times), 'mean': sum(times) / len(times), 'repeat': repeat}
+
+def run_tool(name, *args):
+	env = dict(os.environ)
+	env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+	subprocess.run([sys.executable, os.path.join(ROOT, 'bin', name), *args], env=env, check=True, stdout=subprocess.DEVNULL)
+
+def fresh_copy(source, target):
+	"""
+	Get a function that replaces a directory tree with a fresh copy of another one.
+	"""
+	def copy():
+		shutil.rmtree(target, ignore_errors=True)
+		shutil.copytree(source, target)
+	return copy
+
+def benchmarks(directory):
+	"""
+	Get the benchmarks to run as a dictionary of name to function,
+	or to a (setup, function) tuple for benchmarks that need fresh data for each run.
+	The tool workflows run on the updated PKGBUILD tree, so they find packages to list and bump.
+	"""
+	db_file      = os.path.join(directory, 'repo', 'bench.db')
+	repo_dir     = os.path.join(directory, 'repo')
+	pkgbuild_dir = os.path.join(directory, 'pkgbuild')
+	updated_dir  = os.path.join(directory, 'pkgbuild-updated')
+	bump_dir     = os.path.join(directory, 'pkgbuild-bump')
+	repository   = aprt.read_package_db_file(db_file)
+	packages     = list(repository.values())
+	versions     = [package.version() for package in packages]
+	neighbours   = aprt.reverse_neighbour_table(packages)
+
+	return {
+		'read_package_db_file':    lambda: aprt.read_package_db_file(db_file),
+		'iter_package_db':         lambda: sum(1 for _ in aprt.iter_package_db(db_file, {'depends'})),
+		'version_parse':           lambda: [aprt.Version.parse.__wrapped__(package.get_value('version')) for package in packages],
+		'version_sort':            lambda: sorted(versions),
+		'version_sort_key':        lambda: sorted(versions, key=lambda x: x.key),
+		'reverse_neighbour_table': lambda: aprt.reverse_neighbour_table(packages),
+		'dependency_graph':        lambda: aprt.dependency_graph(packages),
+		'reachability_table':      lambda: aprt.reachability_table(neighbours),
+		'srcinfo_load_db':         lambda: aprt.SrcInfo.load_db(pkgbuild_dir),
+		'find_outdated':           lambda: dict(find_outdated(repository, repo_dir, repository, set(), True)),
+		'aprt-list-unbuilt':       lambda: run_tool('aprt-list-unbuilt', '-p', updated_dir, '-r', db_file),
+		'aprt-list-outdated':      lambda: run_tool('aprt-list-outdated', '-c', db_file),
+		'aprt-bump-pkgrel':        (fresh_copy(updated_dir, bump_dir), lambda: run_tool('aprt-bump-pkgrel', '-p', bump_dir, '-r', db_file, '--unbuilt', '-d')),
+		'aprt-clean-repo':         lambda: run_tool('aprt-clean-repo', '-r', db_file),
+	}
+
+def compare(results, baseline):
+	for name, result in results.items():
+		if name not in baseline:
+			print('{:<28} {:>10.4f}s'.format(name, result['best']))
+			continue
+		ratio = result['best'] / baseline[name]['best']
+		print('{:<28} {:>10.4f}s {:>10.4f}s {:>7.2f}x'.format(name, result['best'], baseline[name]['best'], ratio))
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmark aprt on a generated repository and PKGBUILD tree.')
+	parser.add_argument('-n', '--count',    dest='count',    type=int,   default=1000,                   help='The number of packages to generate.')
+	parser.add_argument('-s', '--shape',    dest='shape',    choices=generate.SHAPES, default='mixed',   help='The shape of the dependency graph.')
+	parser.add_argument('--split',          dest='split',    type=float, default=0.1,                    help='The fraction of split packages.')
+	parser.add_argument('--seed',           dest='seed',     type=int,   default=0,                      help='The random seed.')
+	parser.add_argument('-r', '--repeat',   dest='repeat',   type=int,   default=3,                      help='The number of times to run each benchmark.')
+	parser.add_argument('-k', '--only',     dest='only',     action='append', default=[],                help='Only run the named benchmark (may be given multiple times).')
+	parser.add_argument('-o', '--output',   dest='output',   default=None,                               help='Write the results as JSON to this file.')
+	parser.add_argument('-b', '--baseline', dest='baseline', default=None,                               help='Compare the results with a JSON file from an earlier run.')
+	options = parser.parse_args()
+
+	results = {}
+	with tempfile.TemporaryDirectory() as directory:
+		generate.generate(directory, options.count, options.shape, options.split, options.seed)
+		for name, function in benchmarks(directory).items():
+			if options.only and name not in options.only: continue
+			setup, function = function if isinstance(function, tuple) else (None, function)
+			results[name] = measure(function, options.repeat, setup)
+
+	baseline = {}
+	if options.baseline:
+		with open(options.baseline, 'r') as file:
+			baseline = json.load(file)['results']
+	compare(results, baseline)
+
+	if options.output:
+		parameters = {'count': options.count, 'shape': options.shape, 'split': options.split, 'seed': options.seed}
+		with open(options.output, 'w') as file:
+			json.dump({'parameters': parameters, 'results': results}, file, indent=2)
+
+if __name__ == '__main__': main()
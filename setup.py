@@ -10,7 +10,7 @@ setup(
 	author='Maarten de Vries',
 	author_email='maarten@de-vri.es',
 	license='BSD',
-	packages=['aprt'],
+	packages=['aprt', 'aprt.cli'],
 	scripts=glob('bin/*'),
 	include_package_data=True,
 	zip_safe=True
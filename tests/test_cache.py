@@ -0,0 +1,81 @@
+import os
+
+from aprt import alpm
+from aprt import verify
+from aprt.alpm import PackageCache
+from aprt.package import Package
+from aprt.srcinfo import SrcInfo, SrcInfoCache
+from aprt.verify import HashCache, hash_file
+
+def test_hash_cache(tmp_path):
+	filename = tmp_path / 'a.pkg.tar.zst'
+	filename.write_bytes(b'data')
+	with HashCache(str(tmp_path / 'cache.sqlite')) as cache:
+		assert cache.get(str(filename)) is None
+		cache.put(str(filename), 'abc')
+		assert cache.get(str(filename)) == 'abc'
+
+		filename.write_bytes(b'changed')
+		assert cache.get(str(filename)) is None
+
+		os.unlink(filename)
+		assert cache.evict_missing() == 1
+
+def test_package_cache(tmp_path):
+	filename = tmp_path / 'a.pkg.tar.zst'
+	filename.write_bytes(b'data')
+	package = Package('a')
+	package.add_value('pkgver', '1.0-1')
+	with PackageCache(str(tmp_path / 'cache.sqlite')) as cache:
+		cache.put(str(filename), package, 'abc')
+		assert cache.get(str(filename), 'abc').data == package.data
+		assert cache.get(str(filename), 'def') is None
+
+def test_verify_does_not_cache_changed_archive(tmp_path, monkeypatch):
+	filename = tmp_path / 'a-1.0-1-x86_64.pkg.tar.zst'
+	filename.write_bytes(b'data')
+	package = Package('a')
+	package.add_value('filename', filename.name)
+	package.add_value('sha256sum', hash_file(str(filename)))
+
+	def hash_and_modify(path):
+		result = hash_file(path)
+		os.utime(path, ns=(0, 0))
+		return result
+
+	monkeypatch.setattr(verify, 'hash_file', hash_and_modify)
+	with HashCache(str(tmp_path / 'cache.sqlite')) as cache:
+		assert verify.verify_repository({'a': package}, str(tmp_path), cache=cache).ok()
+		assert cache.connection.execute('SELECT COUNT(*) FROM hashes').fetchone() == (0,)
+
+def test_package_cache_does_not_cache_changed_archive(tmp_path, monkeypatch):
+	filename = tmp_path / 'a.pkg.tar.zst'
+	filename.write_bytes(b'data')
+	package = Package('a')
+	package.add_value('pkgver', '1.0-1')
+
+	def read_and_replace(path):
+		filename.write_bytes(b'new data')
+		return package
+
+	monkeypatch.setattr(alpm, 'read_package_file', read_and_replace)
+	with PackageCache(str(tmp_path / 'cache.sqlite')) as cache:
+		assert cache.read_package_file(str(filename)) is package
+		assert cache.connection.execute('SELECT COUNT(*) FROM packages').fetchone() == (0,)
+
+def test_srcinfo_cache_does_not_cache_changed_file(tmp_path, monkeypatch):
+	directory = tmp_path / 'a'
+	directory.mkdir()
+	filename = directory / '.SRCINFO'
+	filename.write_text('pkgbase = a\n\tpkgver = 1.0\n\tpkgrel = 1\n\npkgname = a\n')
+	parse = SrcInfo.parse_file
+
+	def parse_and_edit(path):
+		result = parse(path)
+		filename.write_text('pkgbase = a\n\tpkgver = 2.0\n\tpkgrel = 1\n\npkgname = a\n')
+		return result
+
+	monkeypatch.setattr(SrcInfo, 'parse_file', parse_and_edit)
+	with SrcInfoCache(str(tmp_path / 'cache.sqlite')) as cache:
+		assert list(SrcInfo.load_db(str(tmp_path), cache=cache)) == [str(directory)]
+		assert cache.connection.execute('SELECT COUNT(*) FROM srcinfo').fetchone() == (0,)
@@ -0,0 +1,65 @@
+import os
+import stat
+
+import pytest
+
+from aprt import daemon
+from aprt.srcinfo import SrcInfo
+
+def write_srcinfo(directory, name, pkgver):
+	os.makedirs(directory, exist_ok=True)
+	with open(os.path.join(directory, '.SRCINFO'), 'w') as file:
+		file.write('pkgbase = {0}\n\tpkgver = {1}\n\tpkgrel = 1\n\tarch = x86_64\n\npkgname = {0}\n'.format(name, pkgver))
+
+def test_refresh_only_reloads_changed_directories(tmp_path, monkeypatch):
+	root = str(tmp_path)
+	write_srcinfo(os.path.join(root, 'a'), 'a', '1.0')
+	write_srcinfo(os.path.join(root, 'b'), 'b', '1.0')
+	state = daemon.State(root)
+	if state.inotify is None: pytest.skip('inotify is not available')
+
+	parsed = []
+	walked = []
+	parse  = SrcInfo.parse_file
+	walk   = state.walk
+	monkeypatch.setattr(SrcInfo, 'parse_file', lambda filename: parsed.append(filename) or parse(filename))
+	monkeypatch.setattr(state, 'walk', lambda directory: walked.append(directory) or walk(directory))
+
+	write_srcinfo(os.path.join(root, 'a'), 'a', '2.0')
+	write_srcinfo(os.path.join(root, 'c'), 'c', '1.0')
+	state.refresh()
+	assert sorted(parsed) == [os.path.join(root, 'a', '.SRCINFO'), os.path.join(root, 'c', '.SRCINFO')]
+	assert walked == [os.path.join(root, 'c')]
+	assert [str(x.version()) for x in state.srcinfo_db()['a'].packages()] == ['2.0-1']
+
+	os.unlink(os.path.join(root, 'b', '.SRCINFO'))
+	os.rmdir(os.path.join(root, 'b'))
+	state.refresh()
+	assert sorted(state.srcinfo_db()) == ['a', 'c']
+
+def test_server_socket_mode(tmp_path):
+	path   = str(tmp_path / 'socket')
+	server = daemon.Server(path, None)
+	try:
+		assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+	finally:
+		server.server_close()
+
+	# A stale socket is replaced.
+	daemon.Server(path, None).server_close()
+
+def test_check_paths(tmp_path):
+	root  = str(tmp_path)
+	state = daemon.State(root)
+	state.check_paths(pkgbuild_dir=root, repositories=[], ignore_dirs=[])
+	with pytest.raises(RuntimeError, match='PKGBUILD directory'):
+		state.check_paths(pkgbuild_dir=os.path.join(root, 'other'))
+	with pytest.raises(RuntimeError, match='checked repository'):
+		state.check_paths(check=os.path.join(root, 'repo.db'))
+
+def test_server_does_not_replace_other_files(tmp_path):
+	path = tmp_path / 'socket'
+	path.write_text('data')
+	with pytest.raises(RuntimeError):
+		daemon.Server(str(path), None)
+	assert path.read_text() == 'data'
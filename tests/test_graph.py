@@ -0,0 +1,39 @@
+import pytest
+
+from aprt.graph import DependencyCycleError, build_order, build_waves
+
+def test_build_order_through_unselected_nodes():
+	neighbours = {'a': ['x'], 'x': ['y'], 'y': ['c', 'z'], 'z': ['z', 'y'], 'b': [], 'c': []}
+	assert list(build_order(neighbours, ['a', 'b', 'c'])) == ['b', 'c', 'a']
+	assert build_waves(neighbours, ['a', 'b', 'c']) == [['b', 'c'], ['a']]
+
+def test_build_order_cycle():
+	neighbours = {'a': ['x'], 'x': ['b'], 'b': ['a'], 'c': ['b'], 'd': []}
+	with pytest.raises(DependencyCycleError) as error:
+		list(build_order(neighbours, ['a', 'c', 'd']))
+	assert error.value.cycles == [['a', 'b', 'x']]
+
+def test_self_providing_package():
+	from aprt.outdated import add_rebuilds
+	from aprt.package import Package, dependency_graph
+
+	def package(name, depends = (), provides = ()):
+		result = Package(name)
+		result.add_value('pkgver', '1.0')
+		result.add_value('pkgrel', '1')
+		result.add_value('epoch',  None)
+		result.add_values('depends',  list(depends))
+		result.add_values('provides', list(provides))
+		return result
+
+	repository = {
+		'a': package('a', ['virtual'], ['virtual']),
+		'b': package('b', ['a']),
+	}
+	graph = dependency_graph(repository.values())
+	assert 'a' not in graph.dependencies('a')
+	assert list(build_order(graph, ['a', 'b'])) == ['a', 'b']
+
+	outdated = {'a': []}
+	add_rebuilds(outdated, repository, repository, set())
+	assert outdated == {'a': [], 'b': [('a', repository['a'].version(), 'rebuild')]}
@@ -0,0 +1,40 @@
+from aprt.mapped import MappedRepository, save_mapped_repository
+from aprt.package import Package, ProvidesIndex
+from aprt.universe import Universe
+
+def make_package(name, version, provides = ()):
+	pkgver, _, pkgrel = version.rpartition('-')
+	package = Package(name)
+	package.add_value('pkgver', pkgver)
+	package.add_value('pkgrel', pkgrel)
+	package.add_value('epoch',  None)
+	package.add_values('provides', list(provides))
+	return package
+
+def test_provider_names_without_decoding(tmp_path):
+	packages = {
+		'a': make_package('a', '1.0-1', ['virtual=1.0', 'libfoo.so']),
+		'b': make_package('b', '2.0-1', ['virtual']),
+		'c': make_package('c', '1.0-1', ['c-compat=1']),
+	}
+	filename = str(tmp_path / 'repo.snapshot')
+	save_mapped_repository(filename, packages)
+
+	with MappedRepository(filename) as repository:
+		assert repository.provider_names('virtual') == {'a', 'b'}
+		assert repository.provider_names('libfoo.so') == {'a'}
+		assert repository.provider_names('c') == {'c'}
+		assert repository.provider_names('missing') == set()
+		assert repository.cache == {}
+
+		# A later layer shadows package b, which no longer provides virtual.
+		universe = Universe([('repo', repository), ('override', {'b': make_package('b', '3.0-1')})])
+		index    = universe.provides_index()
+		assert index.provider_names('virtual') == {'a'}
+		assert index.provides(universe['a'], 'libfoo.so')
+		assert sorted(repository.cache) == ['a']
+
+		eager = ProvidesIndex(universe.values())
+		for name in ('virtual', 'libfoo.so', 'a', 'b', 'c', 'c-compat', 'missing'):
+			assert index.provider_names(name) == eager.provider_names(name)
+			assert sorted((p.name, str(v)) for p, v in index.provider_entries(name)) == sorted((p.name, str(v)) for p, v in eager.provider_entries(name))
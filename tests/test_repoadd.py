@@ -0,0 +1,20 @@
+import pytest
+
+PKGINFO = b'pkgname = old\npkgbase = old\npkgver = 1.0-1\narch = x86_64\n'
+
+def test_archive_without_buildinfo_has_no_installed_entry(tmp_path):
+	libarchive = pytest.importorskip('libarchive')
+	from aprt import repoadd
+
+	filename = str(tmp_path / 'old-1.0-1-x86_64.pkg.tar.gz')
+	with libarchive.file_writer(filename, 'ustar', 'gzip') as archive:
+		archive.add_file_from_memory('.PKGINFO', len(PKGINFO), PKGINFO)
+
+	assert repoadd.read_package_entry(filename, files=False, installed=True).installed is None
+
+	db_filename        = str(tmp_path / 'repo.db.tar.gz')
+	installed_filename = repoadd.installed_db_filename(db_filename)
+	repoadd.update_repository(db_filename, [filename], installed_filename=installed_filename)
+	assert list(repoadd.read_db_entries(db_filename)) == ['old']
+	assert repoadd.read_db_entries(installed_filename) == {}
+	assert repoadd.index_installed(db_filename) == []
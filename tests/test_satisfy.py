@@ -0,0 +1,70 @@
+import pytest
+
+from aprt.alpm import archive_package_to_db, parse_info_bytes
+from aprt.package import Package
+from aprt.satisfy import check_dependencies, simulate_upgrade
+
+PKGINFO = b'''pkgname = newpkg
+pkgbase = newpkg
+pkgver = 1:2.0-3
+size = 4096
+arch = x86_64
+provides = virtual=2.0
+depend = base>=1
+depend = doesnotexist>=5
+'''
+
+def make_package(name, version, depends = (), provides = ()):
+	pkgver, _, pkgrel = version.rpartition('-')
+	package = Package(name)
+	package.add_value('pkgver', pkgver)
+	package.add_value('pkgrel', pkgrel)
+	package.add_value('epoch',  None)
+	package.add_values('depends',  list(depends))
+	package.add_values('provides', list(provides))
+	return package
+
+def archive_package(pkginfo):
+	data    = parse_info_bytes(pkginfo)
+	package = Package(data.pop('pkgname')[0])
+	for key, values in data.items():
+		package.add_values(key, values)
+	return package
+
+def test_archive_package_to_db():
+	package = archive_package_to_db(archive_package(PKGINFO))
+	assert package.name == 'newpkg'
+	assert str(package.version()) == '1:2.0-3'
+	assert [str(x) for x in package.depends()] == ['base>=1', 'doesnotexist>=5']
+	assert package.get_value('isize') == '4096'
+	assert package.providesName('virtual')
+
+def test_upgrade_archive_with_unsatisfiable_depend():
+	universe = {'base': make_package('base', '1.0-1')}
+	upgrade  = archive_package_to_db(archive_package(PKGINFO))
+	result   = simulate_upgrade(universe, {upgrade.name: upgrade})
+	assert [str(x) for x in result.broken] == ['newpkg: depends doesnotexist>=5 (missing)']
+	assert result.fixed == []
+
+def test_upgrade_archive_file_with_unsatisfiable_depend(tmp_path):
+	libarchive = pytest.importorskip('libarchive')
+	from aprt.alpm import read_package_file_as_db
+
+	buildinfo = b'format = 2\npkgname = newpkg\npkgver = 1:2.0-3\n'
+	filename  = str(tmp_path / 'newpkg-1:2.0-3-x86_64.pkg.tar.gz')
+	with libarchive.file_writer(filename, 'ustar', 'gzip') as archive:
+		for name, data in (('.PKGINFO', PKGINFO), ('.BUILDINFO', buildinfo)):
+			archive.add_file_from_memory(name, len(data), data)
+
+	universe = {'base': make_package('base', '1.0-1')}
+	upgrade  = read_package_file_as_db(filename)
+	result   = simulate_upgrade(universe, {upgrade.name: upgrade})
+	assert [str(x) for x in result.broken] == ['newpkg: depends doesnotexist>=5 (missing)']
+
+def test_check_dependencies_versions():
+	universe = {
+		'a': make_package('a', '1.0-1', ['b>=2', 'c', 'virtual=3']),
+		'b': make_package('b', '1.5-1'),
+		'c': make_package('c', '1.0-1', provides=['virtual=3']),
+	}
+	assert [str(x) for x in check_dependencies(universe)] == ['a: depends b>=2 (found b 1.5-1)']
@@ -0,0 +1,47 @@
+from aprt import stats
+
+def test_span_memory_peaks():
+	stats.reset()
+	stats.enable(trace_memory=True)
+	try:
+		with stats.span('outer'):
+			with stats.span('big'):
+				data = bytearray(8 * 2**20)
+				del data
+			with stats.span('small'):
+				data = bytearray(2**20)
+				del data
+		report = stats.report()
+	finally:
+		stats.disable()
+		stats.reset()
+
+	peaks = report['memory_peak']
+	assert peaks['big']   >= 8 * 2**20
+	assert peaks['small'] <  4 * 2**20
+	assert peaks['outer'] >= peaks['big']
+	assert report['memory_peak_total'] >= peaks['big']
+
+def test_threads():
+	import concurrent.futures
+
+	def work(_):
+		for _ in range(1000):
+			with stats.span('outer'):
+				with stats.span('inner'):
+					stats.count('work')
+
+	stats.reset()
+	stats.enable(trace_memory=True)
+	try:
+		with concurrent.futures.ThreadPoolExecutor(8) as executor:
+			list(executor.map(work, range(8)))
+		report = stats.report()
+	finally:
+		stats.disable()
+		stats.reset()
+
+	assert report['counters']['work'] == 8000
+	assert report['spans']['outer']['count'] == 8000
+	assert report['spans']['inner']['count'] == 8000
+	assert report['memory_peak']['outer'] >= report['memory_peak']['inner']
@@ -0,0 +1,12 @@
+import pytest
+
+from aprt.version import Version, compare_versions
+
+def test_compare_versions():
+	lhs = [Version.parse('1.0-1'), Version.parse('2.0-1'), Version.parse('1:1.0-1')]
+	rhs = [Version.parse('1.0-2'), Version.parse('2.0-1'), Version.parse('3.0-1')]
+	assert compare_versions(lhs, rhs) == [-1, 0, 1]
+
+def test_compare_versions_length_mismatch():
+	with pytest.raises(ValueError):
+		compare_versions([Version.parse('1.0-1')], [])